@@ -0,0 +1,15 @@
+import argparse
+
+from dotenv import load_dotenv
+
+from utils.mongodb_bot import backfill_trip_starts
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description="Record the parsed trip start date on documents stored without one.")
+parser.add_argument("--limit", type=int, default=None, help="update at most this many documents")
+parser.add_argument("--dry-run", action="store_true", help="only count documents without a trip start date")
+args = parser.parse_args()
+
+count = backfill_trip_starts(limit=args.limit, dry_run=args.dry_run)
+print(f"✅ {'Would update' if args.dry_run else 'Updated'} {count} documents.")
@@ -0,0 +1,75 @@
+"""Page chrome benchmark.
+
+Renders synthetic 30- and 60-day itineraries end to end (deterministic mode,
+no cover image) and reports page count, PDF size and render time. With
+--baseline the same documents are also rendered with draw_page_elements as
+it was at an earlier git revision, which repainted the background, logo,
+header, footer, watermark and border on every page. From the repository
+root:
+
+    python -m benchmarks.bench_chrome [--days 30 60] [--repeat 5] [--baseline HEAD~1]
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import time
+
+import utils.render_bot as render_bot
+import utils.reportlab_bot as reportlab_bot
+from benchmarks.bench_story import load_baseline, synthetic_itinerary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOUR_COSTS = {"Per Adult": "INR 85,000", "Per Child": "INR 55,000"}
+INCLUSIONS = ["Hotel stays with breakfast", "Airport transfers", "Sightseeing by private car"]
+EXCLUSIONS = ["Flights", "Visa fees", "Personal expenses"]
+CONTACT_INFO = {"website": "https://www.travel-bureau.com", "email": "enjoy@travel-bureau.com", "phone": "+91 98450 00000"}
+
+
+@contextlib.contextmanager
+def page_elements(module):
+    # Templates look draw_page_elements up in render_bot, the summary page in reportlab_bot
+    saved = render_bot.draw_page_elements, reportlab_bot.draw_page_elements
+    render_bot.draw_page_elements = reportlab_bot.draw_page_elements = module.draw_page_elements
+    try:
+        yield
+    finally:
+        render_bot.draw_page_elements, reportlab_bot.draw_page_elements = saved
+
+
+def render(text, days):
+    start = time.perf_counter()
+    pdf_bytes, _ = render_bot.render_itinerary_pdf(
+        text, None, f"{days} days", "01 Oct 2025 - 30 Oct 2025", "Ashok", "2 Adults", TOUR_COSTS,
+        INCLUSIONS, EXCLUSIONS, CONTACT_INFO, destination="Kerala", deterministic=True
+    )
+    return (time.perf_counter() - start) * 1000, pdf_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 60])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="git revision to compare against")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # logo/logo.png is opened relative to the working directory
+    modules = {"current": reportlab_bot}
+    if args.baseline:
+        modules[args.baseline] = load_baseline(args.baseline)
+
+    print(f"{'draw_page_elements':<24} {'days':>6} {'pages':>6} {'PDF KB':>9} {'render ms':>10}")
+    print("-" * 59)
+    for days in args.days:
+        text = synthetic_itinerary(days)
+        for label, module in modules.items():
+            with page_elements(module):
+                samples = [render(text, days) for _ in range(args.repeat)]
+            pdf_bytes = samples[-1][1]
+            pages = pdf_bytes.count(b"/Type /Page\n")
+            ms = statistics.median(ms for ms, _ in samples)
+            print(f"{label:<24} {days:>6} {pages:>6} {len(pdf_bytes) / 1024:>9.1f} {ms:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cover image benchmark.
+
+Builds a one-page PDF with a cover image the size add_coverpage uses, once
+embedding the source image as-is (the old behaviour) and once with the
+image downscaled and recompressed by fetch_cover_image's processing stage.
+Reports PDF size and doc.build time. From the repository root:
+
+    python -m benchmarks.bench_covers [--image cache/images/Singapore.jpg] [--repeat 7]
+"""
+import argparse
+import math
+import os
+import statistics
+import time
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import Image, SimpleDocTemplate
+
+from utils.unsplash_bot import COVER_IMAGE_DPI, COVER_IMAGE_QUALITY, downscale_image
+
+
+def build(img_data, width, height):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=60, bottomMargin=40)
+    start = time.perf_counter()
+    doc.build([Image(BytesIO(img_data), width=width, height=height)])
+    return (time.perf_counter() - start) * 1000, len(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", default=os.path.join(ROOT, "cache", "images", "Singapore.jpg"))
+    parser.add_argument("--dpi", type=int, default=COVER_IMAGE_DPI)
+    parser.add_argument("--quality", type=int, default=COVER_IMAGE_QUALITY)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        source = f.read()
+    # Same frame as add_coverpage: A4 width minus margins, 0.6 aspect
+    width = A4[0] - 80
+    height = width * 0.6
+    size = (math.ceil(width * args.dpi / 72), math.ceil(height * args.dpi / 72))
+
+    start = time.perf_counter()
+    processed = downscale_image(source, size, args.quality)
+    process_ms = (time.perf_counter() - start) * 1000
+
+    print(f"source {len(source) // 1024} KB -> processed {len(processed) // 1024} KB "
+          f"({size[0]}x{size[1]} px, q{args.quality}) in {process_ms:.1f} ms, cached after the first render")
+    print(f"{'cover image':<26} {'build ms':>10} {'PDF KB':>10}")
+    print("-" * 48)
+    for label, img_data in (("before (source as-is)", source), ("after (processed)", processed)):
+        runs = [build(img_data, width, height) for _ in range(args.repeat)]
+        print(f"{label:<26} {statistics.median(t for t, _ in runs):>10.1f} {runs[0][1] / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
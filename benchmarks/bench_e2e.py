@@ -0,0 +1,205 @@
+"""End-to-end pipeline benchmark, offline.
+
+Replays data/itineraries.json, data/itineraries_bkp.json and generated
+30- and 60-day itineraries through main.create_itinerary_pdf with the
+in-process stand-ins from benchmarks.stand_ins in place of OpenAI, Redis
+and MongoDB. Each case starts from empty stand-ins, so the first pass
+misses the ChatGPT cache and later passes hit it; PDF reuse is off so
+every pass renders. Reports the median latency of each stage, throughput,
+peak traced memory of one trip and mean PDF size.
+
+The results are compared against benchmarks/baselines/e2e.json and the
+run exits with status 1 if any case got slower, bigger or hungrier than
+the baseline allows. Timings depend on the machine: after a deliberate
+change, or on a new machine, record a new baseline with --save-baseline.
+From the repository root:
+
+    python -m benchmarks.bench_e2e [--repeat 3] [--llm-delay 0] [--save-baseline]
+"""
+import argparse
+import contextlib
+import copy
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baselines", "e2e.json")
+# Allowed growth over the baseline before the run fails
+TOLERANCES = {"trip_ms": 0.25, "peak_mb": 0.10, "pdf_kb": 0.05}
+
+os.chdir(ROOT)  # Fonts, logo and data files are opened relative to the repository root
+
+import main as pipeline
+from benchmarks import stand_ins
+from benchmarks.bench_story import synthetic_itinerary
+from utils import chatgpt_bot, mongodb_bot, render_bot
+
+# (stage, module, attribute): each is timed wherever the pipeline calls it
+STAGES = [
+    ("cache", chatgpt_bot, "load_chatgpt_cache"),
+    ("openai", chatgpt_bot, "_generate_itinerary"),
+    ("story", render_bot, "_itinerary_story"),
+    ("build", render_bot, "build_pdf_memory"),
+    ("render", pipeline, "render_itinerary_pdf"),
+    ("store", pipeline, "store_itinerary_pdf"),
+]
+
+
+def load_trips(path):
+    with open(os.path.join(ROOT, path), "r", encoding="utf-8") as f:
+        return json.load(f)["trips"]
+
+
+def long_trips(days, count):
+    # The itinerary sent to ChatGPT is short; the response is what grows with the trip length
+    template = load_trips("data/itineraries_bkp.json")[0]
+    trips, responses = [], {}
+    for n in range(count):
+        trip = copy.deepcopy(template)
+        trip["trip_title"] = f"{days}-day Grand Tour {n + 1}"
+        trip["itinerary_text"] = "\n".join(f"Day {day}: Sightseeing, stop {n + 1}" for day in range(1, days + 1))
+        responses[trip["itinerary_text"]] = synthetic_itinerary(days, seed=days * 100 + n)
+        trips.append(trip)
+    return trips, responses
+
+
+def cases():
+    yield "itineraries", load_trips("data/itineraries.json"), {}
+    yield "itineraries_bkp", load_trips("data/itineraries_bkp.json"), {}
+    yield ("long_30", *long_trips(30, 3))
+    yield ("long_60", *long_trips(60, 2))
+
+
+@contextlib.contextmanager
+def timed_stages(samples):
+    saved = [(module, attribute, getattr(module, attribute)) for _, module, attribute in STAGES]
+
+    def timed(stage, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples[stage].append((time.perf_counter() - start) * 1000)
+        return wrapper
+
+    for stage, module, attribute in STAGES:
+        setattr(module, attribute, timed(stage, getattr(module, attribute)))
+    try:
+        yield
+    finally:
+        for module, attribute, fn in saved:
+            setattr(module, attribute, fn)
+
+
+def create_pdf(trip, contact_info):
+    return pipeline.create_itinerary_pdf(
+        trip["itinerary_text"], trip["trip_title"], trip["trip_dates"], trip["traveler_name"], trip["pax"],
+        trip["tour_costs"], trip["inclusions"], trip["exclusions"], contact_info, trip["destination"],
+        source="benchmark"  # Anything but "local": nothing is written to generated_pdfs
+    )
+
+
+def run_case(trips, responses, contact_info, repeat, llm_delay):
+    stand_ins.install(responses, llm_delay)
+    samples = defaultdict(list)
+    trip_ms = []
+    with timed_stages(samples):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for trip in trips:
+                trip_start = time.perf_counter()
+                create_pdf(trip, contact_info)
+                trip_ms.append((time.perf_counter() - trip_start) * 1000)
+        elapsed = time.perf_counter() - start
+
+    pdf_sizes = [mongodb_bot.pdf_bucket.file_size(file_id) for file_id in mongodb_bot.pdf_bucket.files]
+
+    # Separate pass: tracemalloc slows Python down too much to share one with the timings
+    stand_ins.install(responses, llm_delay)
+    peak = 0
+    tracemalloc.start()
+    try:
+        for trip in trips:
+            gc.collect()  # Leftovers of the timing passes would otherwise be freed mid-trip
+            tracemalloc.reset_peak()
+            create_pdf(trip, contact_info)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    result = {stage: statistics.median(values) for stage, values in samples.items()}
+    result.update(
+        trips=len(trips),
+        trip_ms=statistics.median(trip_ms),
+        trips_per_s=len(trip_ms) / elapsed,
+        peak_mb=peak / 1024 / 1024,
+        pdf_kb=statistics.mean(pdf_sizes) / 1024,
+    )
+    return result
+
+
+def regressions(name, result, baseline):
+    for metric, tolerance in TOLERANCES.items():
+        allowed = baseline[metric] * (1 + tolerance)
+        if result[metric] > allowed:
+            yield f"{name}: {metric} {result[metric]:.2f} > {allowed:.2f} (baseline {baseline[metric]:.2f} + {tolerance:.0%})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="passes over each case; the first one misses the cache")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds the OpenAI stand-in takes per call")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {os.path.relpath(BASELINE_FILE, ROOT)}")
+    args = parser.parse_args()
+
+    # Same bytes for the same input, and every pass renders instead of reusing the stored PDF
+    pipeline.DETERMINISTIC_RENDER = True
+    pipeline.PDF_CACHE = False
+    with open(os.path.join(ROOT, "data", "contact.json"), "r", encoding="utf-8") as f:
+        contact_info = json.load(f)
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # The pipeline's own progress output
+        # Font registration and first imports would otherwise land on the first case
+        run_case(load_trips("data/itineraries.json"), {}, contact_info, 1, 0)
+        for name, trips, responses in cases():
+            results[name] = run_case(trips, responses, contact_info, args.repeat, args.llm_delay)
+
+    stages = [stage for stage, _, _ in STAGES]
+    print(f"{'case':<16} {'trips':>5} " + " ".join(f"{stage:>8}" for stage in stages)
+          + f" {'trip ms':>8} {'trips/s':>8} {'peak MB':>8} {'PDF KB':>8}")
+    print("-" * (16 + 6 + 9 * len(stages) + 36))
+    for name, result in results.items():
+        print(f"{name:<16} {result['trips']:>5} " + " ".join(f"{result.get(stage, 0):>8.1f}" for stage in stages)
+              + f" {result['trip_ms']:>8.1f} {result['trips_per_s']:>8.2f} {result['peak_mb']:>8.1f} {result['pdf_kb']:>8.1f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({name: {metric: round(result[metric], 2) for metric in TOLERANCES} for name, result in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {os.path.relpath(BASELINE_FILE, ROOT)}")
+        return
+
+    if not os.path.exists(BASELINE_FILE):
+        print("No baseline yet; record one with --save-baseline")
+        return
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        baselines = json.load(f)
+    failures = [line for name, result in results.items() if name in baselines
+                for line in regressions(name, result, baselines[name])]
+    for line in failures:
+        print(f"❌ {line}")
+    if failures:
+        sys.exit(1)
+    print("✅ Within baseline")
+
+if __name__ == "__main__":
+    main()
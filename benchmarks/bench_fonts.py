@@ -0,0 +1,73 @@
+"""register_styles() benchmark.
+
+Times font registration in fresh interpreters for three setups:
+the original parse-everything path with the full Symbola, the subset
+Symbola with an empty font cache, and the subset with a warm cache.
+Run ``python build_fonts.py`` first, then from the repository root:
+
+    python -m benchmarks.bench_fonts [--repeat 7]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BEFORE = """
+import time
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from utils.styles import FONT_FILES, SYMBOLA_FULL_PATH
+start = time.perf_counter()
+pdfmetrics.registerFont(TTFont("Symbola", SYMBOLA_FULL_PATH))
+for name, path in FONT_FILES.items():
+    pdfmetrics.registerFont(TTFont(name, path))
+print(time.perf_counter() - start)
+"""
+
+AFTER = """
+import time
+import utils.styles as styles
+styles.FONT_CACHE_DIR = {cache_dir!r}
+start = time.perf_counter()
+styles.register_styles()
+print(time.perf_counter() - start)
+"""
+
+
+def run_ms(code):
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip()) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="font-cache-")
+    try:
+        cold = []
+        for _ in range(args.repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(run_ms(AFTER.format(cache_dir=cache_dir)))
+        results = {
+            "before (full Symbola, no cache)": [run_ms(BEFORE) for _ in range(args.repeat)],
+            "after (subset, cold cache)": cold,
+            "after (subset, warm cache)": [run_ms(AFTER.format(cache_dir=cache_dir)) for _ in range(args.repeat)],
+        }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"{'register_styles()':<34} {'median ms':>10} {'min ms':>10}")
+    print("-" * 56)
+    for label, samples in results.items():
+        print(f"{label:<34} {statistics.median(samples):>10.1f} {min(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Peak memory per render benchmark.
+
+Renders synthetic 30- and 60-day itineraries with render_itinerary_pdf and
+reports the peak traced memory (tracemalloc) of the render, of handing the
+PDF from a render worker to the parent (pickle, as ProcessPoolExecutor
+does) and of storing it (build_pdf_record into the in-process MongoDB and
+GridFS stand-ins, GridFS and inline). With --baseline the render is also
+measured with build_pdf_memory as it was at an earlier git revision. From
+the repository root:
+
+    python -m benchmarks.bench_memory [--days 30 60] [--baseline HEAD~1]
+"""
+import argparse
+import gc
+import os
+import pickle
+import tracemalloc
+
+import utils.mongodb_bot as mongodb_bot
+import utils.render_bot as render_bot
+from benchmarks import stand_ins
+from benchmarks.bench_chrome import CONTACT_INFO, EXCLUSIONS, INCLUSIONS, TOUR_COSTS
+from benchmarks.bench_story import load_baseline, synthetic_itinerary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_mb(fn):
+    # Peak above what was already allocated when fn started
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def render(text, days):
+    pdf_bytes, barcode_metadata = render_bot.render_itinerary_pdf(
+        text, None, f"{days} days", "01 Oct 2025 - 30 Oct 2025", "Ashok", "2 Adults", TOUR_COSTS,
+        INCLUSIONS, EXCLUSIONS, CONTACT_INFO, destination="Kerala", deterministic=True
+    )
+    return pdf_bytes, barcode_metadata
+
+
+def store(pdf_bytes, barcode_metadata, storage):
+    mongodb_bot.PDF_STORAGE = storage
+    record = mongodb_bot.build_pdf_record(barcode_metadata, "Ashok", "Kerala", "Trip", "01 Oct 2025 - 30 Oct 2025", pdf_bytes)
+    mongodb_bot.insert_pdf_records([record])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 60])
+    parser.add_argument("--baseline", help="git revision to compare against")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # logo/logo.png is opened relative to the working directory
+    stand_ins.install()
+    render_bot.get_stylesheet()  # Fonts and styles are loaded once per process, not per render
+    build_pdf_memory = render_bot.build_pdf_memory
+    baseline = load_baseline(args.baseline).build_pdf_memory if args.baseline else None
+
+    print(f"{'days':>6} {'PDF KB':>8} {'render MB':>10} {'baseline MB':>12} {'hand-off MB':>12} {'GridFS MB':>10} {'inline MB':>10}")
+    print("-" * 74)
+    for days in args.days:
+        text = synthetic_itinerary(days)
+        render(text, days)  # Warm-up: first use of each glyph and image is cached by ReportLab
+        (pdf_bytes, barcode_metadata), render_peak = peak_mb(lambda: render(text, days))
+
+        baseline_peak = None
+        if baseline:
+            render_bot.build_pdf_memory = baseline
+            try:
+                _, baseline_peak = peak_mb(lambda: render(text, days))
+            finally:
+                render_bot.build_pdf_memory = build_pdf_memory
+
+        result = (pdf_bytes, barcode_metadata)
+        _, handoff_peak = peak_mb(lambda: pickle.loads(pickle.dumps(result)))
+        _, gridfs_peak = peak_mb(lambda: store(pdf_bytes, barcode_metadata, "gridfs"))
+        _, inline_peak = peak_mb(lambda: store(pdf_bytes, barcode_metadata, "inline"))
+
+        baseline_column = f"{baseline_peak:>12.2f}" if baseline_peak is not None else f"{'-':>12}"
+        print(f"{days:>6} {len(pdf_bytes) / 1024:>8.1f} {render_peak:>10.2f} {baseline_column} "
+              f"{handoff_peak:>12.2f} {gridfs_peak:>10.2f} {inline_peak:>10.2f}")
+
+if __name__ == "__main__":
+    main()
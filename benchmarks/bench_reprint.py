@@ -0,0 +1,105 @@
+"""Reprint lookup benchmark against a large collection.
+
+Seeds a scratch collection (default 100k documents with inline PDFs) in the
+database from MONGODB_URI / MONGODB_DB_NAME, then times barcode lookups:
+
+* before: no indexes, full document fetched (the old fetch_pdf_from_mongodb)
+* after:  INDEXES from utils.mongodb_bot, METADATA_PROJECTION lookup, then the
+          PDF bytes by _id once the match is confirmed
+
+The scratch collection is dropped afterwards unless --keep is given.
+
+    python -m benchmarks.bench_reprint [--docs 100000] [--pdf-kb 2] [--lookups 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, UTC
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from utils.mongodb_bot import INDEXES, METADATA_PROJECTION
+
+DESTINATIONS = ["Dubai", "Singapore", "Phuket", "Meghalaya", "Pattaya & Bangkok", "Bali", "Goa", "Kerala"]
+TRAVELERS = ["Ashok", "Varsha", "Meera", "Rahul", "Priya", "Arjun", "Kavya", "Rohan"]
+
+
+def seed(collection, docs, pdf_kb, batch_size=1000):
+    payload = os.urandom(pdf_kb * 1024)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    barcodes = []
+    for offset in range(0, docs, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, docs)):
+            traveler = TRAVELERS[i % len(TRAVELERS)]
+            destination = DESTINATIONS[i % len(DESTINATIONS)]
+            barcode = f"{traveler}_{destination}_ITIN-{i:08d}".replace(" ", "_")
+            barcodes.append(barcode)
+            batch.append({
+                "barcode_id": barcode,
+                "traveler_name": traveler,
+                "destination": destination,
+                "trip_title": f"{destination} Holiday",
+                "trip_dates": "01 Jan 2026 - 05 Jan 2026",
+                "created_at": start + timedelta(minutes=i),
+                "pdf_data": payload,
+            })
+        collection.insert_many(batch, ordered=False)
+    return barcodes
+
+
+def time_lookups(lookup, barcodes):
+    samples = []
+    for barcode in barcodes:
+        started = time.perf_counter()
+        record = lookup(barcode)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert record is not None, barcode
+    return samples
+
+
+def report(label, samples):
+    p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+    print(f"{label:<40} {statistics.median(samples):>10.2f} {p95:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--pdf-kb", type=int, default=2, help="inline PDF size per seeded document")
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch collection")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))[os.getenv("MONGODB_DB_NAME")]
+    collection = db[f"bench_reprint_{os.getpid()}"]
+
+    try:
+        print(f"Seeding {args.docs} documents into {collection.name} ...")
+        barcodes = random.sample(seed(collection, args.docs, args.pdf_kb), args.lookups)
+
+        def before(barcode):
+            return collection.find_one({"barcode_id": barcode})
+
+        def after(barcode):
+            record = collection.find_one({"barcode_id": barcode}, METADATA_PROJECTION)
+            if record:
+                record["pdf_data"] = collection.find_one({"_id": record["_id"]}, {"pdf_data": 1})["pdf_data"]
+            return record
+
+        print(f"{'reprint lookup':<40} {'median ms':>10} {'p95 ms':>10}")
+        print("-" * 62)
+        report("before (no index, full document)", time_lookups(before, barcodes))
+        collection.create_indexes(INDEXES)
+        report("after (indexed, projected + by _id)", time_lookups(after, barcodes))
+    finally:
+        if not args.keep:
+            collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cold-start import benchmark.
+
+Imports each project module in a fresh interpreter with ``-X importtime`` and
+reports its cumulative import time, so side effects at import show up as a
+regression. Run from the repository root:
+
+    python -m benchmarks.bench_startup [--repeat 5]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "utils.styles",
+    "utils.redis_bot",
+    "utils.mongodb_bot",
+    "utils.unsplash_bot",
+    "utils.chatgpt_bot",
+    "utils.reportlab_bot",
+    "utils.render_bot",
+    "main",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def import_time_us(module):
+    # Cumulative microseconds reported by -X importtime for the module itself
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) == module:
+            return int(match.group(2))
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<22} {'median ms':>10} {'min ms':>10}")
+    print("-" * 44)
+    for module in MODULES:
+        try:
+            samples = [import_time_us(module) / 1000 for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:<22} {'error':>10}  {e}")
+            continue
+        print(f"{module:<22} {statistics.median(samples):>10.1f} {min(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
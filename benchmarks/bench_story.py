@@ -0,0 +1,135 @@
+"""html_to_story microbenchmark.
+
+Times turning the enhanced itinerary into flowables for synthetic 30- and
+60-day itineraries that use every line type the parser knows (time-of-day
+and time-range labels, accommodation, highlights, tips, notes, quotes,
+lists, checklist): from markdown text (HTML conversion included), and from
+ready HTML once in full and once with Paragraph and Spacer stubbed out so
+only parsing and line classification are left. With --baseline the same
+input also goes through the code as it was at an earlier git revision.
+From the repository root:
+
+    python -m benchmarks.bench_story [--days 30 60] [--repeat 20] [--baseline HEAD~1]
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import subprocess
+import time
+import types
+
+import utils.reportlab_bot as reportlab_bot
+from utils.render_bot import get_stylesheet
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIME_LABELS = ["Morning", "Early Morning", "Afternoon", "Late Afternoon", "Evening", "Late Evening", "Night",
+               "All Day", "Full Day", "Morning till Evening", "Late Night"]
+TIME_RANGES = ["Morning to Afternoon", "Afternoon & Evening", "Evening and Night"]
+PLACES = ["the old town", "the harbour", "the night market", "a hill temple", "the national museum",
+          "a spice plantation", "the botanical garden", "a floating village", "the sunset point"]
+
+
+def synthetic_itinerary(days, seed=None):
+    """LLM-style enhanced itinerary in markdown, the shape enhance_itinerary_with_chatgpt returns."""
+    rng = random.Random(days if seed is None else seed)
+    lines = [
+        f"Travel Itinerary: A {days}-day journey through coast, hills and cities.  ",
+        "Primary Traveller Name: Ashok  ",
+        "Travel Dates: 01-Oct-2025 to 30-Oct-2025  ",
+        "Travelers: 2 Adults and 1 Child (age 7)  ",
+        "",
+    ]
+    for day in range(1, days + 1):
+        place = rng.choice(PLACES)
+        heading = f"Day {day}: Exploring {place.title()}"
+        lines.append(rng.choice([heading, f"**{heading}**", f"### {heading}"]))
+        for label in rng.sample(TIME_LABELS, 3):
+            lines.append(f"- {label}: Visit {rng.choice(PLACES)} and stop at **{place}**, then relax.")
+        lines.append(f"- {rng.choice(TIME_RANGES)}: Free time around {place} (note: shops close at 9 pm).")
+        lines.append(f"- Accommodation: Overnight at a *boutique hotel* near {place}.")
+        lines.append("")
+        lines.append(f"Highlights: The view from {place}; street food at {rng.choice(PLACES)}.")
+        lines.append(f"Travel Tips: Carry water and cash. Note: {rng.choice(['book ahead', 'dress modestly'])}.")
+        lines.append(f"Local Experience: Try the regional breakfast near {place}.")
+        if day % 5 == 0:
+            lines.append("")
+            lines.append(f"> Remember to keep {rng.choice(['passports', 'tickets', 'medicines'])} handy.")
+            lines.append("")
+            lines.append("1. Confirm the pickup time")
+            lines.append("2. Check the weather forecast")
+        lines.append("")
+    lines.append("Day-wise highlights: every day above has its own summary.")
+    lines.append("")
+    lines.append("Packaging checklist:")
+    for item in ["Passport and visa copies", "Sunscreen", "Light cotton clothes", "Rain jacket",
+                 "Walking shoes", "Power bank", "Basic medicines"]:
+        lines.append(f"- {item}")
+    return "\n".join(lines) + "\n"
+
+
+def load_baseline(revision):
+    # html_to_story as committed at revision, loaded as a separate module
+    source = subprocess.run(["git", "show", f"{revision}:utils/reportlab_bot.py"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType(f"reportlab_bot_{revision}")
+    exec(compile(source, f"{revision}:utils/reportlab_bot.py", "exec"), module.__dict__)
+    return module
+
+
+def markdown_to_html(module, text):
+    # Revisions before the single-parse conversion sanitized, serialized and tightened in separate passes
+    if hasattr(module, "markdown_to_html"):
+        return module.markdown_to_html(text)
+    return module.tighten_bold_punctuation(module.sanitize_html_for_pdf(text))
+
+
+@contextlib.contextmanager
+def without_layout(module):
+    # Flowable construction (ReportLab's markup parser) dominates; stub it to see the classifier
+    saved = module.Paragraph, module.Spacer, module.PageBreak
+    module.Paragraph = module.Spacer = module.PageBreak = lambda *args, **kwargs: args
+    try:
+        yield
+    finally:
+        module.Paragraph, module.Spacer, module.PageBreak = saved
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 60])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", help="git revision to compare against")
+    args = parser.parse_args()
+
+    styles, _ = get_stylesheet()
+    modules = {"current": reportlab_bot}
+    if args.baseline:
+        modules[args.baseline] = load_baseline(args.baseline)
+
+    print(f"{'html_to_story':<24} {'days':>6} {'flowables':>10} {'markdown ms':>12} {'full ms':>10} {'no layout ms':>13}")
+    print("-" * 80)
+    for days in args.days:
+        text = synthetic_itinerary(days)
+        for label, module in modules.items():
+            html = markdown_to_html(module, text)
+            flowables = len(module.html_to_story(html, styles))
+            from_markdown = time_ms(lambda: module.html_to_story(markdown_to_html(module, text), styles), args.repeat)
+            full = time_ms(lambda: module.html_to_story(html, styles), args.repeat)
+            with without_layout(module):
+                no_layout = time_ms(lambda: module.html_to_story(html, styles), args.repeat)
+            print(f"{label:<24} {days:>6} {flowables:>10} {from_markdown:>12.2f} {full:>10.2f} {no_layout:>13.2f}")
+
+if __name__ == "__main__":
+    main()
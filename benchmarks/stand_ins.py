@@ -0,0 +1,154 @@
+"""In-process stand-ins for Redis, MongoDB/GridFS and OpenAI.
+
+install() puts them where the bots keep their lazily created clients, so
+the pipeline runs offline with no connection settings. Only the calls the
+pipeline makes are implemented.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import types
+
+import bson
+from bson import ObjectId
+
+from utils import chatgpt_bot, mongodb_bot, redis_bot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Real ChatGPT responses, used for any itinerary without a registered response
+STORED_RESPONSES = os.path.join(ROOT, "cache", "chatgpt_cache.json")
+GRIDFS_CHUNK_SIZE = 255 * 1024  # pymongo's default
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self.lock:
+            if nx and key in self.store:
+                return None
+            self.store[key] = value if isinstance(value, bytes) else str(value).encode()
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.store.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return int(key in self.store)
+
+    def eval(self, script, numkeys, key, token):
+        # Only RELEASE_LOCK_SCRIPT is ever evaluated
+        with self.lock:
+            if self.store.get(key) == token.encode():
+                del self.store[key]
+                return 1
+            return 0
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+
+    def create_indexes(self, indexes):
+        return [str(index) for index in indexes]
+
+    def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        bson.encode(document)  # The copy pymongo makes to send it
+        self.documents[document["_id"]] = document
+        return types.SimpleNamespace(inserted_id=document["_id"])
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            self.insert_one(document)
+        return types.SimpleNamespace(inserted_ids=[document["_id"] for document in documents])
+
+    def find_one(self, query, projection=None, sort=None):
+        matches = [document for document in self.documents.values()
+                   if all(document.get(field) == value for field, value in query.items())]
+        for field, direction in reversed(sort or []):
+            matches.sort(key=lambda document: document.get(field), reverse=direction < 0)
+        return matches[0] if matches else None
+
+
+class FakeBucket:
+    def __init__(self):
+        self.files = {}
+
+    def upload_from_stream(self, filename, source, metadata=None):
+        # Chunk by chunk, like GridFS: the whole file is never copied at once
+        file_id = ObjectId()
+        read = (io.BytesIO(source) if isinstance(source, bytes) else source).read
+        chunks = []
+        while chunk := read(GRIDFS_CHUNK_SIZE):
+            bson.encode({"files_id": file_id, "n": len(chunks), "data": chunk})
+            chunks.append(chunk)
+        self.files[file_id] = chunks
+        return file_id
+
+    def file_size(self, file_id):
+        return sum(len(chunk) for chunk in self.files[file_id])
+
+    def open_download_stream(self, file_id):
+        return io.BytesIO(b"".join(self.files[file_id]))
+
+    def delete(self, file_id):
+        self.files.pop(file_id, None)
+
+
+class FakeOpenAI:
+    """chat.completions.create returning a canned response after llm_delay seconds."""
+
+    def __init__(self, responses=None, llm_delay=0.0):
+        self.responses = dict(responses or {})
+        self.llm_delay = llm_delay
+        self.calls = 0
+        with open(STORED_RESPONSES, "r", encoding="utf-8") as f:
+            self.stored = list(json.load(f).values())
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def response_for(self, itinerary_text):
+        if itinerary_text in self.responses:
+            return self.responses[itinerary_text]
+        # Same itinerary, same stored response, every run
+        digest = hashlib.sha256(itinerary_text.encode()).digest()
+        return self.stored[int.from_bytes(digest[:4], "big") % len(self.stored)]
+
+    def create(self, model, messages, max_tokens=None, stream=False, stream_options=None):
+        self.calls += 1
+        time.sleep(self.llm_delay)
+        # The itinerary is the last paragraph of the user prompt
+        text = self.response_for(messages[-1]["content"].split("\n\n", 1)[1])
+        message = types.SimpleNamespace(content=text)
+        usage = types.SimpleNamespace(prompt_tokens=len(messages[-1]["content"]) // 4, completion_tokens=len(text) // 4)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            chunks = [types.SimpleNamespace(choices=[types.SimpleNamespace(delta=message)], usage=None)]
+            if (stream_options or {}).get("include_usage"):
+                chunks.append(types.SimpleNamespace(choices=[], usage=usage))
+            return iter(chunks)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+def install(responses=None, llm_delay=0.0):
+    """Fresh, empty stand-ins for every service. Returns the fake OpenAI, for its call count."""
+    redis_bot.redis_client = FakeRedis()
+    with redis_bot._memory_lock:
+        redis_bot.memory_cache.clear()
+
+    mongodb_bot.db = {}
+    mongodb_bot.collection = FakeCollection()
+    mongodb_bot.pdf_bucket = FakeBucket()
+
+    fake_openai = FakeOpenAI(responses, llm_delay)
+    chatgpt_bot.openai = fake_openai
+    return fake_openai
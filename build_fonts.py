@@ -0,0 +1,87 @@
+"""Font build step.
+
+Subsets fonts/Symbola.ttf down to the glyphs our PDFs can emit and warms the
+parsed-font cache used by register_styles(). Needs fontTools, which is only a
+build-time dependency:
+
+    pip install fonttools
+    python build_fonts.py
+
+The deploy step only warms the cache, from the committed subset:
+
+    python build_fonts.py --cache-only
+"""
+import argparse
+import io
+import os
+import tokenize
+
+from utils.styles import SYMBOLA_FULL_PATH, SYMBOLA_SUBSET_PATH, register_styles
+
+# Modules whose string literals (emoji maps, labels, watermarks) are drawn in Symbola
+EMOJI_SOURCES = ["utils/reportlab_bot.py"]
+
+# Symbola also renders user text in cost, traveler and contact tables
+TEXT_RANGES = [
+    (0x0020, 0x007E),  # Basic Latin
+    (0x00A0, 0x017F),  # Latin-1 Supplement, Latin Extended-A
+    (0x2000, 0x206F),  # General Punctuation
+    (0x20A0, 0x20CF),  # Currency Symbols (₹, €, ...)
+    (0x2100, 0x214F),  # Letterlike Symbols
+    (0x2190, 0x21FF),  # Arrows
+    (0x2600, 0x27BF),  # Miscellaneous Symbols, Dingbats
+]
+
+
+def collect_source_characters(paths):
+    chars = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            tokens = tokenize.tokenize(io.BytesIO(f.read()).readline)
+            for token in tokens:
+                if token.type == tokenize.STRING:
+                    chars.update(ch for ch in token.string if ord(ch) > 0x7E)
+    return {ord(ch) for ch in chars}
+
+
+def build_symbola_subset():
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        raise SystemExit("fontTools is required for this build step: pip install fonttools")
+
+    unicodes = collect_source_characters(EMOJI_SOURCES)
+    for start, end in TEXT_RANGES:
+        unicodes.update(range(start, end + 1))
+
+    font = TTFont(SYMBOLA_FULL_PATH)
+    available = set(font.getBestCmap())
+    missing = sorted(u for u in unicodes if u > 0x7E and u not in available and not 0xFE00 <= u <= 0xFE0F)
+    emitted_missing = [chr(u) for u in missing if u in collect_source_characters(EMOJI_SOURCES)]
+
+    options = subset.Options()
+    options.notdef_outline = True
+    options.name_IDs = ["*"]
+    options.glyph_names = True
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=unicodes & available)
+    subsetter.subset(font)
+    font.save(SYMBOLA_SUBSET_PATH)
+
+    print(f"✅ {SYMBOLA_SUBSET_PATH}: {len(unicodes & available)} code points, "
+          f"{os.path.getsize(SYMBOLA_FULL_PATH) // 1024} KB -> {os.path.getsize(SYMBOLA_SUBSET_PATH) // 1024} KB")
+    if emitted_missing:
+        print(f"⚠️ Not in Symbola, rendered as blanks: {' '.join(emitted_missing)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache-only", action="store_true",
+                        help="skip the Symbola subset and only warm the parsed-font cache")
+    args = parser.parse_args()
+
+    if not args.cache_only:
+        build_symbola_subset()
+    register_styles()
+    print("✅ Parsed font cache warmed")
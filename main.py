@@ -2,48 +2,41 @@ import asyncio
 import os
 from dotenv import load_dotenv
 import json
-import requests
 from datetime import datetime
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, Spacer, PageBreak, NextPageTemplate
-from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame
-import re
-
-from utils.chatgpt_bot import initialize_chatgpt, enhance_itinerary_with_chatgpt
-from utils.mongodb_bot import initialize_mongodb, load_data_to_mongodb
-from utils.redis_bot import initialize_redis
-from utils.reportlab_bot import generate_qr_code, draw_page_elements, \
-    sanitize_html_for_pdf, tighten_bold_punctuation, html_to_story, \
-    add_coverpage, render_summary_section, draw_summary_page, build_pdf_local, build_pdf_memory
-from utils.styles import register_styles
-from utils.unsplash_bot import initialize_unsplash
+
+from utils.chatgpt_bot import initialize_chatgpt, enhance_itinerary_with_chatgpt, stream_itinerary_with_chatgpt
+from utils.metrics import count, current_fields, metrics_scope, span
+from utils.mongodb_bot import load_data_to_mongodb, build_pdf_record, insert_pdf_records, \
+    find_pdf_by_barcode, find_pdf_by_content_hash, write_stored_pdf, delete_pdf_file
+from utils.redis_bot import get_cache_stats, load_chatgpt_cache
+from utils.render_bot import COVER_IMAGES, initialize_render_pool, render_itinerary_pdf, render_itinerary_pdf_async, \
+    render_itinerary_pdf_streaming, pdf_content_hash
+from utils.reportlab_bot import save_pdf_local
+from utils.profiling import profiled, sample_profile
+from utils.unsplash_bot import prefetch_images
 
 load_dotenv()
 
-initialize_redis()
-initialize_mongodb()
-initialize_unsplash()
+# Redis, MongoDB, Unsplash and fonts are set up on first use, not at import,
+# so cold starts only pay for what a request actually touches
 initialize_chatgpt()
 
-emoji_style, link_style, heading_style, sub_heading_style, day_style, normal_style, small_style, THEME_COLOR, EMOJI_COLOR = register_styles()
-
 # ======= Configuration =======
 CACHE_DIR = "cache"
 IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
 CHATGPT_CACHE_FILE = os.path.join(CACHE_DIR, "chatgpt_cache.json")
 PDF_OUTPUT_DIR = "generated_pdfs"
 PDF_RERENDER_DIR = "pdfs_from_db"
-PLACEHOLDER_IMAGE = BytesIO(requests.get("https://images.unsplash.com/photo-1559311648-d46f5d8593d6?q=80&w=3500&auto=format&fit=crop&ixlib=rb-4.1.0&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D").content)
+MAX_CONCURRENT_TRIPS = int(os.getenv("MAX_CONCURRENT_TRIPS", "4"))
+STREAM_CHATGPT = os.getenv("STREAM_CHATGPT", "false").lower() == "true"
+PDF_CACHE = os.getenv("PDF_CACHE", "true").lower() == "true"
+DETERMINISTIC_RENDER = os.getenv("DETERMINISTIC_RENDER", "false").lower() == "true"
 
 # Create necessary directories
 os.makedirs(PDF_OUTPUT_DIR, exist_ok=True)
 
 # ======= PDF Generation =======
-def create_itinerary_pdf(itinerary_text, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None, source="local", cache_flag=True):
-    detailed_itinerary = enhance_itinerary_with_chatgpt(itinerary_text, cache_flag=cache_flag)
-
+def get_pdf_path(trip_dates, destination=None):
     # Generate PDF file name
     if destination:
         safe_dest = destination.replace(' ', '_')
@@ -53,123 +46,186 @@ def create_itinerary_pdf(itinerary_text, trip_title, trip_dates, traveler_name,
         pdf_file_name = f"{safe_dest}_{start_date}_{end_date}.pdf"
     else:
         pdf_file_name = f"Itinerary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    pdf_path = os.path.join(PDF_OUTPUT_DIR, pdf_file_name)
-
-    doc = BaseDocTemplate(
-        pdf_path,
-        pagesize=A4,
-        rightMargin=40,
-        leftMargin=40,
-        topMargin=60,
-        bottomMargin=40
-    )
-    frame = Frame(
-        doc.leftMargin,
-        doc.bottomMargin,
-        doc.width,
-        doc.height,
-        id='normal',
-        showBoundary=0  # Set to 1 if you want visible frame borders
-    )
-    template = PageTemplate(id='main', frames=[frame], onPage=draw_page_elements)
-    doc.addPageTemplates([template])
-
-    # Define a frame for the summary page
-    summary_frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='summary')
-
-    # Register the summary page template with your custom draw function
-    summary_template = PageTemplate(id='SummaryPage', frames=[summary_frame], onPage=draw_summary_page)
-
-    # Add it to the document
-    doc.addPageTemplates([summary_template])
-
-    styles = getSampleStyleSheet()
-    styles.add(emoji_style)
-    styles.add(heading_style)
-    styles.add(sub_heading_style)
-    styles.add(day_style)
-    styles.add(normal_style)
-    styles.add(small_style)
-    story = []
-
-    # Add metadata for barcode
-    doc.traveler_name = traveler_name
-    doc.destination = destination
-
-    # ---- Cover Page ----
-    story = add_coverpage(doc, story, image_flag=False)
-
-    story.append(Paragraph(f"<b>{trip_title}</b>", styles["CenterHeading"]))
-    story.append(Paragraph(f"Dates: {trip_dates}", styles["CenterHeading"]))
-    story.append(Paragraph(f"Traveler: {traveler_name}", styles["CenterHeading"]))
-    story.append(Paragraph(f"Pax: {pax_details}", styles["CenterHeading"]))
-    story.append(Spacer(1, 30))
-    story.append(Paragraph("Powered by Travel Bureau", styles["CenterHeading"]))
-    story.append(PageBreak())
-
-    # ---- Itinerary Pages ----
-    safe_html = sanitize_html_for_pdf(detailed_itinerary)
-    safe_html = tighten_bold_punctuation(safe_html)
-    story.extend(html_to_story(safe_html, styles))
-
-    # ---- Summary Page ----
-    story.append(NextPageTemplate("SummaryPage"))
-    qr_buffer = generate_qr_code(contact_info['website'])
-    render_summary_section(story, styles, tour_costs, inclusions, exclusions, contact_info, qr_buffer, doc, link_style)
-
+    return os.path.join(PDF_OUTPUT_DIR, pdf_file_name)
+
+def stored_barcode_duplicate(barcode_metadata, content_hash):
+    """Id of the stored PDF already carrying this barcode for the same content, else None.
+
+    Only deterministic renders repeat a barcode: unchanged content points at the stored PDF
+    instead of adding a second document, and a barcode already used for other content is
+    rejected with ValueError. Other barcodes end in a random suffix and are never looked up.
+    """
+    if not DETERMINISTIC_RENDER:
+        return None
+    record = find_pdf_by_barcode(barcode_metadata)
+    if record is None:
+        return None
+    if record.get("content_hash") != content_hash:
+        raise ValueError(f"Barcode {barcode_metadata} is already used by another PDF")
+    print(f"♻️ Identical PDF already stored as {record['_id']}")
+    count("pdf_reused")
+    return str(record["_id"])
+
+def store_itinerary_pdf(pdf_path, pdf_bytes, barcode_metadata, traveler_name, destination, trip_title, trip_dates, source="local", content_hash=None):
     if source == "local":
-        build_pdf_local(doc, story, pdf_path)
+        with span("save_local"):
+            save_pdf_local(pdf_bytes, pdf_path)
 
-    pdf_bytes = build_pdf_memory(doc, story)
-
-    barcode_metadata = getattr(doc, "barcode_metadata", None)
-    mongo_res = load_data_to_mongodb(barcode_metadata, traveler_name, destination, trip_title, trip_dates, pdf_bytes)
+    existing_id = stored_barcode_duplicate(barcode_metadata, content_hash)
+    if existing_id:
+        return existing_id
+    mongo_res = load_data_to_mongodb(barcode_metadata, traveler_name, destination, trip_title, trip_dates, pdf_bytes, content_hash)
     print(f"PDF data for {traveler_name} with destination {destination} loaded to mongodb for future reference!")
-    return mongo_res
-
-async def run_bot(request=None, source="local"):
-    return await main(request, source)
+    return str(mongo_res.inserted_id)
 
-def trigger(request):
-    return asyncio.run(run_bot(request, source="gcp"))
+def prepare_itinerary_record(pdf_path, pdf_bytes, barcode_metadata, traveler_name, destination, trip_title, trip_dates, source="local", content_hash=None):
+    # Like store_itinerary_pdf, but the record is left for main() to bulk insert with the rest of the batch.
+    # Returns (mongo_id, record); record is None when the identical PDF is already stored
+    if source == "local":
+        with span("save_local"):
+            save_pdf_local(pdf_bytes, pdf_path)
+    existing_id = stored_barcode_duplicate(barcode_metadata, content_hash)
+    if existing_id:
+        return existing_id, None
+    record = build_pdf_record(barcode_metadata, traveler_name, destination, trip_title, trip_dates, pdf_bytes, content_hash)
+    return str(record["_id"]), record
+
+def reuse_cached_pdf(content_hash, pdf_path, source="local"):
+    # An unchanged itinerary was rendered before: hand back that document instead of laying it out again
+    if not PDF_CACHE:
+        return None
+    record = find_pdf_by_content_hash(content_hash)
+    if not record:
+        return None
 
-# ======= Example Usage =======
-async def main(request=None, source="local", cache_flag=True):
-    print(source)
-    itinerary_data = {}
-    request_data = {}
-    mongo_id = None
-    if not request:
-        with open("data/itineraries.json", "r", encoding="utf-8") as f:
-            itinerary_data = json.load(f)
+    if source == "local":
+        write_stored_pdf(record, pdf_path)
+        print(f"PDF generated at: {pdf_path}")
+    print(f"♻️ Reusing stored PDF {record['_id']} for an unchanged itinerary")
+    count("pdf_reused")
+    return str(record["_id"])
+
+def create_itinerary_pdf(itinerary_text, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None, source="local", cache_flag=True, stream=False):
+    pdf_path = get_pdf_path(trip_dates, destination)
+
+    detailed_itinerary = None
+    if stream and cache_flag:
+        # On a ChatGPT cache hit the full text is known: nothing to stream, and the stored PDF may be reused
+        with span("chatgpt"):
+            detailed_itinerary = load_chatgpt_cache(itinerary_text)
+
+    if stream and detailed_itinerary is None:
+        # Flowables are built day by day while the completion streams in
+        with span("stream_render"):
+            pdf_bytes, barcode_metadata, detailed_itinerary = render_itinerary_pdf_streaming(
+                stream_itinerary_with_chatgpt(itinerary_text, cache_flag=cache_flag),
+                pdf_path, trip_title, trip_dates, traveler_name, pax_details,
+                tour_costs, inclusions, exclusions, contact_info, destination,
+                deterministic=DETERMINISTIC_RENDER
+            )
+        content_hash = pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        )
     else:
-        try:
-            request_data = request.get_json(silent=True)
-            itinerary_data = request_data
+        if detailed_itinerary is None:
+            with span("chatgpt"):
+                detailed_itinerary = enhance_itinerary_with_chatgpt(itinerary_text, cache_flag=cache_flag)
+        content_hash = pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        )
+        cached_id = reuse_cached_pdf(content_hash, pdf_path, source)
+        if cached_id:
+            return cached_id
+
+        profile_tag = sample_profile(current_fields().get("trip_id"), content_hash)
+        with span("render"), profiled(profile_tag):
+            pdf_bytes, barcode_metadata = render_itinerary_pdf(
+                detailed_itinerary, pdf_path, trip_title, trip_dates, traveler_name, pax_details,
+                tour_costs, inclusions, exclusions, contact_info, destination,
+                deterministic=DETERMINISTIC_RENDER
+            )
 
-        except Exception as e:
-            print(f"⚠️ Error: {e}")
-            return "❌ Failed to process request!", 500
+    return store_itinerary_pdf(pdf_path, pdf_bytes, barcode_metadata, traveler_name, destination, trip_title, trip_dates, source, content_hash)
+
+async def create_itinerary_pdf_async(itinerary_text, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None, source="local", cache_flag=True, stream=False):
+    """Same stages as create_itinerary_pdf, without blocking the event loop.
+
+    Network stages (Redis, OpenAI, MongoDB) run in threads, layout in the render pool.
+    Returns (mongo_id, record); record is the document still to be inserted, or None
+    when a stored PDF was reused.
+    """
+    pdf_path = get_pdf_path(trip_dates, destination)
+
+    detailed_itinerary = None
+    if stream and cache_flag:
+        # On a ChatGPT cache hit the full text is known: nothing to stream, and the stored PDF may be reused
+        with span("chatgpt"):
+            detailed_itinerary = await asyncio.to_thread(load_chatgpt_cache, itinerary_text)
+
+    if stream and detailed_itinerary is None:
+        # Streaming interleaves network reads and layout, so it runs in one thread
+        with span("stream_render"):
+            pdf_bytes, barcode_metadata, detailed_itinerary = await asyncio.to_thread(
+                render_itinerary_pdf_streaming,
+                stream_itinerary_with_chatgpt(itinerary_text, cache_flag=cache_flag),
+                pdf_path, trip_title, trip_dates, traveler_name, pax_details,
+                tour_costs, inclusions, exclusions, contact_info, destination,
+                deterministic=DETERMINISTIC_RENDER
+            )
+        content_hash = pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        )
+    else:
+        if detailed_itinerary is None:
+            with span("chatgpt"):
+                detailed_itinerary = await asyncio.to_thread(enhance_itinerary_with_chatgpt, itinerary_text, cache_flag=cache_flag)
+        content_hash = pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        )
+        cached_id = await asyncio.to_thread(reuse_cached_pdf, content_hash, pdf_path, source)
+        if cached_id:
+            return cached_id, None
+
+        # Includes the wait for a free render worker
+        with span("render"):
+            pdf_bytes, barcode_metadata = await render_itinerary_pdf_async(
+                detailed_itinerary, pdf_path, trip_title, trip_dates, traveler_name, pax_details,
+                tour_costs, inclusions, exclusions, contact_info, destination,
+                deterministic=DETERMINISTIC_RENDER,
+                profile_tag=sample_profile(current_fields().get("trip_id"), content_hash)
+            )
 
-    if itinerary_data:
-        with open("data/contact.json", "r", encoding="utf-8") as f:
-            contact_info = json.load(f)
+    return await asyncio.to_thread(
+        prepare_itinerary_record,
+        pdf_path, pdf_bytes, barcode_metadata, traveler_name, destination, trip_title, trip_dates, source, content_hash
+    )
 
-        for trip in itinerary_data["trips"]:
-            trip_id = trip["id"]
-            trip_title = trip["trip_title"]
-            trip_dates = trip["trip_dates"]
-            traveler_name = trip["traveler_name"]
-            pax_details = trip["pax"]
-            tour_costs = trip["tour_costs"]
-            inclusions = trip["inclusions"]
-            exclusions = trip["exclusions"]
-            destination = trip["destination"]
-            itinerary_text = trip["itinerary_text"]
-            # ✅ use .get() with default True
-            cache_flag = trip.get("useCache", True)
-
-            print(f"""
+async def process_trip(trip, contact_info, semaphore, source="local"):
+    # A malformed entry (null, a string, ...) fails on its own instead of aborting the batch
+    trip_id = trip.get("id") if isinstance(trip, dict) else None
+    async with semaphore:
+        with metrics_scope("trip", trip_id=trip_id):
+            try:
+                if not isinstance(trip, dict):
+                    raise ValueError(f"trip must be an object, got {type(trip).__name__}")
+                trip_title = trip["trip_title"]
+                trip_dates = trip["trip_dates"]
+                traveler_name = trip["traveler_name"]
+                pax_details = trip["pax"]
+                tour_costs = trip["tour_costs"]
+                inclusions = trip["inclusions"]
+                exclusions = trip["exclusions"]
+                destination = trip["destination"]
+                itinerary_text = trip["itinerary_text"]
+                # ✅ use .get() with default True
+                cache_flag = trip.get("useCache", True)
+                stream = trip.get("stream", STREAM_CHATGPT)
+
+                print(f"""
 🧳 Trip Summary
 ────────────────────────────────────────────
 📌 Trip ID       : {trip_id}
@@ -193,28 +249,136 @@ async def main(request=None, source="local", cache_flag=True):
 {itinerary_text}
 
 🧾 Use Cache     : {cache_flag}
+📡 Stream        : {stream}
 """)
 
-            # Generate PDF
-            res = create_itinerary_pdf(
-                itinerary_text,
-                trip_title,
-                trip_dates,
-                traveler_name,
-                pax_details,
-                tour_costs,
-                inclusions,
-                exclusions,
-                contact_info,
-                destination,
-                source=source,
-                cache_flag=cache_flag
-            )
+                # Generate PDF
+                mongo_id, record = await create_itinerary_pdf_async(
+                    itinerary_text,
+                    trip_title,
+                    trip_dates,
+                    traveler_name,
+                    pax_details,
+                    tour_costs,
+                    inclusions,
+                    exclusions,
+                    contact_info,
+                    destination,
+                    source=source,
+                    cache_flag=cache_flag,
+                    stream=stream
+                )
+
+                print(mongo_id)
+                # main() pops the record and writes it with the rest of the batch
+                return {"trip_id": trip_id, "status": "success", "mongo_id": mongo_id, "record": record}
+
+            except Exception as e:
+                print(f"⚠️ Trip {trip_id} failed: {e}")
+                return {"trip_id": trip_id, "status": "error", "error": str(e)}
+
+def store_trip_records(results):
+    """Insert every new trip record with one bulk write and mark the trips whose insert failed."""
+    pending = {}
+    first_with_barcode = {}
+    aliases = {}  # _id -> results of other trips in this batch that rendered the identical PDF
+    for result in results:
+        record = result.pop("record", None)
+        if record is None:
+            continue
+        first = first_with_barcode.setdefault(record["barcode_id"], record) if DETERMINISTIC_RENDER else record
+        if first is not record:
+            # Deterministic render with the same barcode as an earlier trip of this batch
+            delete_pdf_file(record)
+            if first.get("content_hash") == record.get("content_hash"):
+                result["mongo_id"] = str(first["_id"])
+                aliases.setdefault(first["_id"], []).append(result)
+            else:
+                error = f"Barcode {record['barcode_id']} is already used by another PDF"
+                print(f"⚠️ Trip {result['trip_id']} failed: {error}")
+                result.update(status="error", error=error)
+                result.pop("mongo_id")
+            continue
+        pending[record["_id"]] = (result, record)
+    if not pending:
+        return
+
+    try:
+        failed = insert_pdf_records([record for _, record in pending.values()])
+    except Exception as e:
+        failed = {record_id: str(e) for record_id in pending}
+
+    for record_id, (result, record) in pending.items():
+        if record_id in failed:
+            for failed_result in [result, *aliases.get(record_id, [])]:
+                print(f"⚠️ Trip {failed_result['trip_id']} failed: {failed[record_id]}")
+                failed_result.update(status="error", error=failed[record_id])
+                failed_result.pop("mongo_id")
+        else:
+            print(f"PDF data for {record['traveler_name']} with destination {record['destination']} loaded to mongodb for future reference!")
+
+async def run_trips(trips, contact_info, semaphore, source="local"):
+    """Process one request's trips, at most semaphore's worth at a time, and write their records.
+
+    Results are in input order. The service shares one semaphore between all requests.
+    """
+    # Start the render workers without waiting for them (trips that reuse a stored PDF never need them),
+    # and fetch every cover image of the batch before the first trip needs it. A failure here only
+    # fails the trips that render: they start the pool and fetch their cover themselves
+    warm_up = [asyncio.to_thread(initialize_render_pool, wait=False)]
+    if COVER_IMAGES:
+        warm_up.append(asyncio.to_thread(prefetch_images, [trip.get("destination") for trip in trips if isinstance(trip, dict)]))
+    for error in await asyncio.gather(*warm_up, return_exceptions=True):
+        if isinstance(error, Exception):
+            print(f"⚠️ Warm-up failed: {error}")
+
+    results = await asyncio.gather(*[
+        process_trip(trip, contact_info, semaphore, source=source)
+        for trip in trips
+    ])
+    await asyncio.to_thread(store_trip_records, results)
+    print(f"📊 ChatGPT cache: {get_cache_stats()}")
+    return results
+
+async def run_bot(request=None, source="local"):
+    return await main(request, source)
+
+def trigger(request):
+    # Spans and per-trip metrics are logged as they finish; the response adds the request's summary
+    with metrics_scope("request", source="gcp") as metrics:
+        results = asyncio.run(run_bot(request, source="gcp"))
+    if isinstance(results, tuple):
+        return results  # (message, status) of a request that couldn't be read
+    return {"results": results, "metrics": metrics.summary()}
+
+# ======= Example Usage =======
+async def main(request=None, source="local", cache_flag=True, max_concurrency=None):
+    print(source)
+    itinerary_data = {}
+    request_data = {}
+    results = []
+    if not request:
+        with open("data/itineraries.json", "r", encoding="utf-8") as f:
+            itinerary_data = json.load(f)
+    else:
+        try:
+            request_data = request.get_json(silent=True)
+            itinerary_data = request_data
+
+        except Exception as e:
+            print(f"⚠️ Error: {e}")
+            return "❌ Failed to process request!", 500
+
+    if itinerary_data:
+        with open("data/contact.json", "r", encoding="utf-8") as f:
+            contact_info = json.load(f)
 
-            mongo_id = re.search(r"ObjectId\('([a-f0-9]{24})'\)", str(res)).group(1)
-            print(mongo_id)
-    return mongo_id
+        # Trips run concurrently, at most max_concurrency at a time
+        semaphore = asyncio.Semaphore(max_concurrency or MAX_CONCURRENT_TRIPS)
+        results = await run_trips(itinerary_data["trips"], contact_info, semaphore, source=source)
+    return results
 
 
 if __name__ == "__main__":
-    asyncio.run(run_bot())
+    with metrics_scope("request", source="local"):
+        asyncio.run(run_bot())
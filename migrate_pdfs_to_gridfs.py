@@ -0,0 +1,15 @@
+import argparse
+
+from dotenv import load_dotenv
+
+from utils.mongodb_bot import migrate_inline_pdfs_to_gridfs
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description="Move inline pdf_data from existing documents into GridFS chunks.")
+parser.add_argument("--limit", type=int, default=None, help="migrate at most this many documents")
+parser.add_argument("--dry-run", action="store_true", help="only count documents that still hold inline PDFs")
+args = parser.parse_args()
+
+count = migrate_inline_pdfs_to_gridfs(limit=args.limit, dry_run=args.dry_run)
+print(f"✅ {'Would migrate' if args.dry_run else 'Migrated'} {count} PDFs to GridFS.")
@@ -0,0 +1,25 @@
+import argparse
+import json
+
+from dotenv import load_dotenv
+
+from utils.chatgpt_bot import LocalBatchClient, OpenAIBatchClient, initialize_chatgpt, prefill_chatgpt_cache
+
+load_dotenv()
+initialize_chatgpt()
+
+parser = argparse.ArgumentParser(description="Generate every uncached itinerary in one ChatGPT batch job and fill the Redis cache, so rendering runs from cache.")
+parser.add_argument("--data", default="data/itineraries.json", help="trips file in the main.py input format")
+parser.add_argument("--local", action="store_true", help="run the requests one by one in this process instead of as an OpenAI batch job")
+parser.add_argument("--poll-interval", type=int, default=None, help="seconds between batch status checks")
+parser.add_argument("--timeout", type=int, default=None, help="give up waiting for the batch after this many seconds")
+args = parser.parse_args()
+
+with open(args.data, "r", encoding="utf-8") as f:
+    trips = json.load(f)["trips"]
+
+# Trips with useCache false regenerate on every render anyway
+itinerary_texts = [trip["itinerary_text"] for trip in trips if trip.get("useCache", True)]
+client = LocalBatchClient() if args.local else OpenAIBatchClient()
+summary = prefill_chatgpt_cache(itinerary_texts, client, args.poll_interval, args.timeout)
+print(f"✅ ChatGPT cache: {summary['cached']} already cached, {summary['generated']} generated, {summary['failed']} failed.")
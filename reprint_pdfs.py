@@ -0,0 +1,36 @@
+import argparse
+from datetime import datetime, timedelta, UTC
+
+from dotenv import load_dotenv
+
+from utils.mongodb_bot import PDF_RERENDER_DIR, find_stored_pdfs, reprint_pdfs, reprint_pdfs_to_zip
+
+load_dotenv()
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=UTC)
+
+
+parser = argparse.ArgumentParser(description="Reprint stored itinerary PDFs by barcode, or by destination and travel date.")
+parser.add_argument("barcodes", nargs="*", help="barcode ids to reprint")
+parser.add_argument("--destination", help="reprint every PDF for this destination")
+parser.add_argument("--from", dest="trip_from", type=parse_date, help="trips starting on or after this date (YYYY-MM-DD)")
+parser.add_argument("--to", dest="trip_to", type=parse_date, help="trips starting on or before this date (YYYY-MM-DD)")
+parser.add_argument("--zip", dest="zip_path", help="write one zip archive instead of separate files")
+parser.add_argument("--output-dir", default=PDF_RERENDER_DIR, help="directory for separate files")
+parser.add_argument("--workers", type=int, default=None, help="files written at the same time")
+args = parser.parse_args()
+
+if not (args.barcodes or args.destination or args.trip_from or args.trip_to):
+    parser.error("give barcode ids, --destination or a --from/--to range")
+
+# --to is inclusive of the whole day
+trip_to = args.trip_to + timedelta(days=1) if args.trip_to else None
+records = find_stored_pdfs(args.barcodes, args.destination, args.trip_from, trip_to)
+
+if args.zip_path:
+    count = reprint_pdfs_to_zip(records, args.zip_path)
+else:
+    count = len(reprint_pdfs(records, args.output_dir, args.workers))
+print(f"✅ Reprinted {count} PDFs.")
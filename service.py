@@ -0,0 +1,209 @@
+"""Long-running HTTP service for the itinerary pipeline, as a plain ASGI app.
+
+Unlike trigger(), which starts a fresh event loop per request, the service
+keeps its render pool, fonts and styles, Redis and MongoDB connection pools
+and the in-process ChatGPT cache warm between requests. Run it with any ASGI
+server, in one server process (each process starts its own render pool):
+
+    uvicorn service:app --host 0.0.0.0 --port 8080
+
+    POST /          {"trips": [...]}, the main.py input format
+    GET  /healthz   200 while the process is serving
+    GET  /readyz    200 once warmed up and able to take a request (render pool up,
+                    queue not full), else 503
+"""
+import asyncio
+import json
+import os
+
+from main import MAX_CONCURRENT_TRIPS, run_trips
+from utils.metrics import metrics_scope
+from utils.mongodb_bot import get_collection
+from utils.redis_bot import get_redis_client
+from utils import render_bot
+from utils.render_bot import get_stylesheet, initialize_render_pool, render_pool_ready, reset_render_pool, \
+    shutdown_render_pool
+
+# ======= Configuration =======
+# Requests processed at once; their trips share MAX_CONCURRENT_TRIPS
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+# Requests waiting for a worker; beyond that the service answers 503 until one frees up
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "16"))
+SERVICE_RETRY_AFTER = int(os.getenv("SERVICE_RETRY_AFTER", "5"))
+WARM_UP_RETRY_INTERVAL = 5
+
+# ======= Service state (one event loop per process) =======
+request_queue = None
+trip_semaphore = None
+contact_info = None
+workers = []
+pool_rebuild = None
+ready = False
+draining = False
+
+
+def _warm_up():
+    # Everything a first request would otherwise set up on its way through the pipeline
+    global contact_info
+    initialize_render_pool()
+    get_stylesheet()  # Streaming renders run in this process
+    get_redis_client().ping()
+    get_collection()
+    with open("data/contact.json", "r", encoding="utf-8") as f:
+        contact_info = json.load(f)
+
+async def _warm_up_until_ready():
+    # /healthz answers while this runs; /readyz only once it is done
+    global ready
+    while True:
+        try:
+            await asyncio.to_thread(_warm_up)
+            break
+        except Exception as e:
+            print(f"⚠️ Warm-up failed, retrying in {WARM_UP_RETRY_INTERVAL}s: {e}")
+            await asyncio.sleep(WARM_UP_RETRY_INTERVAL)
+    ready = True
+    print(f"🚀 Service ready: {SERVICE_WORKERS} workers, queue of {SERVICE_QUEUE_SIZE}")
+
+def _rebuild_render_pool():
+    try:
+        pool = render_bot.render_pool
+        if pool is not None:
+            reset_render_pool(pool)
+        initialize_render_pool()
+    except Exception as e:
+        print(f"⚠️ Render pool restart failed: {e}")
+
+def _check_render_pool():
+    # A dead worker (e.g. OOM killed) breaks the whole pool: replace it in the background
+    # and stay not ready until it is back, instead of failing every trip meanwhile
+    global pool_rebuild
+    if render_pool_ready():
+        return True
+    if pool_rebuild is None or pool_rebuild.done():
+        pool_rebuild = asyncio.create_task(asyncio.to_thread(_rebuild_render_pool))
+    return False
+
+async def _request_worker():
+    while True:
+        itinerary_data, response = await request_queue.get()
+        try:
+            with metrics_scope("request", source="service") as metrics:
+                results = await run_trips(itinerary_data["trips"], contact_info, trip_semaphore, source="service")
+            if not response.done():  # The client may have gone; its trips are stored regardless
+                response.set_result({"results": results, "metrics": metrics.summary()})
+        except Exception as e:
+            print(f"⚠️ Request failed: {e}")
+            if not response.done():
+                response.set_exception(e)
+        finally:
+            request_queue.task_done()
+
+async def startup():
+    global request_queue, trip_semaphore, workers
+    request_queue = asyncio.Queue(maxsize=SERVICE_QUEUE_SIZE)
+    trip_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRIPS)
+    workers = [asyncio.create_task(_request_worker()) for _ in range(SERVICE_WORKERS)]
+    workers.append(asyncio.create_task(_warm_up_until_ready()))
+
+async def shutdown():
+    # Stop taking requests, finish the ones already accepted, then release the pools
+    global ready, draining
+    ready, draining = False, True
+    await request_queue.join()
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await asyncio.to_thread(shutdown_render_pool)
+
+
+# ======= HTTP =======
+async def _send_json(send, status, body, headers=()):
+    payload = json.dumps(body, ensure_ascii=False, default=str).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+def _status():
+    return {
+        "ready": ready,
+        "render_pool": render_pool_ready(),
+        "queued": request_queue.qsize() if request_queue else 0,
+        "queue_size": SERVICE_QUEUE_SIZE,
+    }
+
+async def _handle_itineraries(receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        itinerary_data = json.loads(body)
+        if not isinstance(itinerary_data, dict) or not isinstance(itinerary_data.get("trips"), list):
+            raise ValueError('expected {"trips": [...]}')
+    except ValueError as e:
+        await _send_json(send, 400, {"error": f"❌ Invalid request: {e}"})
+        return
+
+    if not ready or not _check_render_pool():
+        await _send_json(send, 503, {"error": "Service is not ready", **_status()},
+                         [(b"retry-after", str(SERVICE_RETRY_AFTER).encode())])
+        return
+    response = asyncio.get_running_loop().create_future()
+    try:
+        request_queue.put_nowait((itinerary_data, response))
+    except asyncio.QueueFull:
+        # Backpressure: refuse now rather than let waiting requests pile up in memory
+        await _send_json(send, 503, {"error": "Service is busy", **_status()},
+                         [(b"retry-after", str(SERVICE_RETRY_AFTER).encode())])
+        return
+
+    try:
+        await _send_json(send, 200, await response)
+    except Exception as e:
+        await _send_json(send, 500, {"error": f"❌ Failed to process request: {e}"})
+
+async def _handle_http(scope, receive, send):
+    method, path = scope["method"], scope["path"]
+    if path == "/healthz" and method in ("GET", "HEAD"):
+        await _send_json(send, 200, {"status": "ok"})
+    elif path == "/readyz" and method in ("GET", "HEAD"):
+        # Also not ready while the queue is full, so a load balancer sends traffic elsewhere
+        can_accept = ready and not draining and not request_queue.full() and _check_render_pool()
+        await _send_json(send, 200 if can_accept else 503, _status())
+    elif path == "/":
+        if method != "POST":
+            await _send_json(send, 405, {"error": "Use POST"}, [(b"allow", b"POST")])
+            return
+        await _handle_itineraries(receive, send)
+    else:
+        await _send_json(send, 404, {"error": "Not found"})
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _handle_lifespan(receive, send)
+    elif scope["type"] == "http":
+        await _handle_http(scope, receive, send)
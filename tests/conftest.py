@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    # Fonts, logo and data files are opened relative to the repository root
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,48 @@
+"""Streamed and blocking ChatGPT calls report the same stages and counters."""
+import pytest
+
+from benchmarks import stand_ins
+from utils.chatgpt_bot import FAILURE_NOTE, enhance_itinerary_with_chatgpt, stream_itinerary_with_chatgpt
+from utils.metrics import metrics_scope
+
+ITINERARY = "Day 1: Arrival in Bali\nDay 2: Ubud"
+
+
+def blocking(itinerary_text):
+    return enhance_itinerary_with_chatgpt(itinerary_text)
+
+
+def streamed(itinerary_text):
+    return "".join(stream_itinerary_with_chatgpt(itinerary_text))
+
+
+@pytest.fixture
+def fake_openai():
+    return stand_ins.install({ITINERARY: "Day 1: Beach\nDay 2: Rice terraces"})
+
+
+@pytest.mark.parametrize("generate", [blocking, streamed])
+def test_completed_call(fake_openai, generate):
+    with metrics_scope("trip") as metrics:
+        generate(ITINERARY)
+
+    summary = metrics.summary()
+    assert summary["stages"]["openai"]["count"] == 1
+    assert summary["counters"]["openai_calls"] == 1
+    assert "openai_failures" not in summary["counters"]
+    assert summary["counters"]["openai_completion_tokens"] > 0
+
+
+@pytest.mark.parametrize("generate", [blocking, streamed])
+def test_failed_call(fake_openai, generate, monkeypatch):
+    def unavailable(**request):
+        raise ConnectionError("OpenAI unavailable")
+
+    monkeypatch.setattr(fake_openai.chat.completions, "create", unavailable)
+    with metrics_scope("trip") as metrics:
+        assert generate(ITINERARY).endswith(FAILURE_NOTE)
+
+    summary = metrics.summary()
+    assert summary["stages"]["openai"]["count"] == 1
+    assert summary["counters"]["openai_failures"] == 1
+    assert "openai_calls" not in summary["counters"]
@@ -0,0 +1,34 @@
+"""Single-flight ChatGPT generation, with the in-process Redis and OpenAI stand-ins."""
+import pytest
+
+from benchmarks import stand_ins
+from utils import chatgpt_bot, redis_bot
+from utils.chatgpt_bot import enhance_itinerary_with_chatgpt, stream_itinerary_with_chatgpt
+from utils.redis_bot import save_chatgpt_cache
+
+ITINERARY = "Day 1: Arrival in Bali"
+
+
+@pytest.fixture
+def leader_finishes_first(monkeypatch):
+    # Another caller saves its result and releases the lock between our cache miss and our lock
+    fake_openai = stand_ins.install()
+    acquire = redis_bot.acquire_generation_lock
+
+    def acquire_after_leader(itinerary_text):
+        save_chatgpt_cache(itinerary_text, "Enhanced by the leader")
+        return acquire(itinerary_text)
+
+    monkeypatch.setattr(chatgpt_bot, "acquire_generation_lock", acquire_after_leader)
+    return fake_openai
+
+
+def test_lock_holder_uses_a_result_saved_before_it_took_the_lock(leader_finishes_first):
+    assert enhance_itinerary_with_chatgpt(ITINERARY) == "Enhanced by the leader"
+    assert leader_finishes_first.calls == 0
+    assert redis_bot.acquire_generation_lock(ITINERARY)  # Released again
+
+
+def test_streaming_lock_holder_uses_a_result_saved_before_it_took_the_lock(leader_finishes_first):
+    assert "".join(stream_itinerary_with_chatgpt(ITINERARY)) == "Enhanced by the leader"
+    assert leader_finishes_first.calls == 0
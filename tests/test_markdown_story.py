@@ -0,0 +1,154 @@
+"""markdown_to_html + html_to_story must build the same flowables as the old two-pass pipeline.
+
+Before the single-parse conversion, html_to_story was fed
+tighten_bold_punctuation(sanitize_html_for_pdf(text)); list_item_text reproduces
+what that did to list items. The flowables that pipeline built for stored ChatGPT
+responses, synthetic itineraries and randomized markdown, whole and block by
+block, are kept as digests in tests/data/markdown_story_golden.json and compared
+against.
+Only when the expected output really changes, regenerate it from the old
+pipeline at a given revision (from the repository root):
+
+    python -m tests.test_markdown_story [REVISION]
+"""
+import functools
+import hashlib
+import json
+import os
+import random
+import sys
+
+import emoji
+import pytest
+
+from benchmarks.bench_story import load_baseline, synthetic_itinerary
+from utils import reportlab_bot
+from utils.chatgpt_bot import split_itinerary_blocks
+from utils.render_bot import get_stylesheet
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "markdown_story_golden.json")
+# Last revision with the two-pass pipeline
+TWO_PASS_REVISION = "1843ad2^"
+
+FRAGMENTS = [
+    "Morning: go", "Afternoon & Evening: relax", "Accommodation: hotel", "Highlights: x", "Tips: y",
+    "Local Experience: z", "Note: careful", "Packaging checklist:", "Day 3: Go", "**Day 4:** bold", "plain text",
+    "&foo; &amp; &nbsp; &#147; &#x1F600;", "<br>", "<br/>", "<span>s</span>", "<div>d</div>", "** **", "* *",
+    "<b> </b>", "<i>\n</i>", "1️⃣", "#️⃣", "📋 📅 ✅ ❌ 👥", "<script>x</script>", "<!-- c -->",
+    "a.**b**.", "__u__!", "- **c**? **d**, e", "<b>f</b>!", "`code`", "x  ", "<p>", "</p>", "</li>", "<ul><li>", "text with < and >",
+]
+EMOJI = sorted(emoji.EMOJI_DATA)
+RANDOM_DOCUMENTS = 200
+
+
+def random_line(rng):
+    parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.4:
+        parts.append(rng.choice(EMOJI))
+    if rng.random() < 0.3:
+        parts.insert(0, rng.choice(EMOJI) + rng.choice(EMOJI))
+    return " ".join(parts)
+
+
+def random_markdown(seed):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(rng.randint(5, 40)):
+        kind = rng.random()
+        if kind < 0.3:
+            lines.append(random_line(rng))
+        elif kind < 0.45:
+            lines.append("- " + random_line(rng))
+        elif kind < 0.5:
+            lines.append("- ")
+        elif kind < 0.55:
+            lines.append("    - " + random_line(rng))
+        elif kind < 0.62:
+            lines.append(f"{rng.randint(1, 9)}. " + random_line(rng))
+        elif kind < 0.67:
+            lines.append("> " + random_line(rng))
+        elif kind < 0.7:
+            lines.append("### " + random_line(rng))
+        elif kind < 0.73:
+            lines.append("```\n" + random_line(rng) + "\n```")
+        elif kind < 0.76:
+            lines.append("| a | b |\n|---|---|\n| " + random_line(rng) + " | x |")
+        else:
+            lines.append("")
+    return "\n".join(lines)
+
+
+def corpus():
+    with open("cache/chatgpt_cache.json", "r", encoding="utf-8") as f:
+        for key, text in json.load(f).items():
+            yield f"cached-{key[:8]}", text
+    for days in (7, 30):
+        yield f"synthetic-{days}", synthetic_itinerary(days)
+    for seed in range(RANDOM_DOCUMENTS):
+        yield f"random-{seed}", random_markdown(seed)
+
+
+def signature(story):
+    return [
+        (type(flowable).__name__, getattr(flowable, "text", None), getattr(getattr(flowable, "style", None), "name", None),
+         getattr(flowable, "height", None) if type(flowable).__name__ == "Spacer" else None)
+        for flowable in story
+    ]
+
+
+def two_pass_html(module, text):
+    return module.tighten_bold_punctuation(module.sanitize_html_for_pdf(text))
+
+
+def stories(module, text, to_html):
+    # Whole text, and block by block as the streaming render builds it. Markup ReportLab
+    # rejects must be rejected the same way, so an error counts as the outcome
+    styles, _ = get_stylesheet()
+    try:
+        whole = signature(module.html_to_story(to_html(module, text), styles))
+    except ValueError as e:
+        whole = repr(e)
+    state, blocks = {}, []
+    try:
+        for block in split_itinerary_blocks(text):
+            blocks.extend(signature(module.html_to_story(to_html(module, block), styles, state)))
+    except ValueError as e:
+        blocks = repr(e)
+    return whole, blocks
+
+
+def digests(outcome):
+    # (whole, blocks) -> one short digest each; the full signatures would take about 1 MB
+    return [hashlib.sha256(json.dumps(part, ensure_ascii=False).encode()).hexdigest()[:16] for part in outcome]
+
+
+@functools.cache
+def golden():
+    with open(GOLDEN_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def single_parse_html(module, text):
+    return module.markdown_to_html(text)
+
+
+@pytest.mark.parametrize("name, text", list(corpus()))
+def test_single_parse_matches_two_pass_pipeline(name, text):
+    assert digests(stories(reportlab_bot, text, single_parse_html)) == golden()[name]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_replace_pdf_emoji_matches_whole_text_scan(seed):
+    text = random_markdown(seed)
+    whole = emoji.replace_emoji(text, replace=lambda e, pos: reportlab_bot.PDF_EMOJI_MAP.get(e, f"[{e}]"))
+    assert reportlab_bot.replace_pdf_emoji(text) == whole
+
+
+if __name__ == "__main__":
+    two_pass = load_baseline(sys.argv[1] if len(sys.argv) > 1 else TWO_PASS_REVISION)
+    expected = {name: digests(stories(two_pass, text, two_pass_html)) for name, text in corpus()}
+    os.makedirs(os.path.dirname(GOLDEN_FILE), exist_ok=True)
+    with open(GOLDEN_FILE, "w", encoding="utf-8") as f:
+        json.dump(expected, f, indent=1)
+        f.write("\n")
+    print(f"{len(expected)} documents written to {os.path.relpath(GOLDEN_FILE)}")
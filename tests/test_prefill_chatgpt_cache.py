@@ -0,0 +1,91 @@
+"""prefill_chatgpt_cache against LocalBatchClient, with the in-process Redis stand-in."""
+import pytest
+
+from benchmarks import stand_ins
+from utils.chatgpt_bot import LocalBatchClient, prefill_chatgpt_cache
+from utils.redis_bot import load_chatgpt_cache, save_chatgpt_cache
+
+CACHED = "Day 1: Arrival in Dubai"
+NEW = "Day 1: Arrival in Bali"
+BROKEN = "Day 1: Arrival in Phuket"
+
+
+def itinerary_text(body):
+    # The itinerary is the last paragraph of the user prompt
+    return body["messages"][-1]["content"].split("\n\n", 1)[1]
+
+
+def complete(body):
+    text = itinerary_text(body)
+    if text == BROKEN:
+        raise RuntimeError("model overloaded")
+    return f"Enhanced: {text}"
+
+
+class ScriptedBatchClient(LocalBatchClient):
+    """Reports the given statuses in turn and returns results only for the given itineraries."""
+
+    def __init__(self, statuses, completed=None):
+        super().__init__(complete)
+        self.statuses = list(statuses)
+        self.completed = completed
+        self.results_read = False
+
+    def status(self, batch_id):
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+    def results(self, batch_id):
+        self.results_read = True
+        return [result for request, result in zip(self.batches[batch_id], super().results(batch_id))
+                if self.completed is None or itinerary_text(request["body"]) in self.completed]
+
+
+@pytest.fixture(autouse=True)
+def services():
+    stand_ins.install()
+
+
+def test_counts_cached_generated_and_failed():
+    save_chatgpt_cache(CACHED, "Enhanced before")
+    client = LocalBatchClient(complete)
+
+    summary = prefill_chatgpt_cache([CACHED, NEW, BROKEN, NEW], client, poll_interval=0)
+
+    assert summary == {"cached": 1, "generated": 1, "failed": 1}
+    assert load_chatgpt_cache(NEW) == f"Enhanced: {NEW}"
+    assert load_chatgpt_cache(BROKEN) is None  # Left for a regular chat call at render time
+    assert len(client.batches["local_batch_1"]) == 2  # Duplicates and cached itineraries aren't sent
+
+
+def test_nothing_to_generate_submits_no_batch():
+    save_chatgpt_cache(CACHED, "Enhanced before")
+    client = LocalBatchClient(complete)
+
+    assert prefill_chatgpt_cache([CACHED], client) == {"cached": 1, "generated": 0, "failed": 0}
+    assert client.batches == {}
+
+
+def test_expired_batch_keeps_the_results_it_has():
+    client = ScriptedBatchClient(["validating", "in_progress", "expired"], completed={NEW})
+
+    summary = prefill_chatgpt_cache([NEW, BROKEN], client, poll_interval=0)
+
+    assert summary == {"cached": 0, "generated": 1, "failed": 1}
+    assert load_chatgpt_cache(NEW) == f"Enhanced: {NEW}"
+
+
+def test_failed_batch_generates_nothing():
+    client = ScriptedBatchClient(["in_progress", "failed"])
+
+    summary = prefill_chatgpt_cache([NEW, BROKEN], client, poll_interval=0)
+
+    assert summary == {"cached": 0, "generated": 0, "failed": 2}
+    assert not client.results_read
+    assert load_chatgpt_cache(NEW) is None
+
+
+def test_unfinished_batch_times_out():
+    client = ScriptedBatchClient(["in_progress"])
+
+    with pytest.raises(TimeoutError):
+        prefill_chatgpt_cache([NEW], client, poll_interval=0, timeout=0.01)
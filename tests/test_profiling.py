@@ -0,0 +1,43 @@
+"""profiled() next to tracemalloc tracing that someone else started."""
+import tracemalloc
+
+import pytest
+
+from utils import profiling
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def allocate():
+    return [bytes(1024) for _ in range(1024)]
+
+
+def test_tracing_started_by_the_profiler_is_stopped_again(profile_dir):
+    assert not tracemalloc.is_tracing()
+
+    with profiling.profiled("own"):
+        allocate()
+
+    assert not tracemalloc.is_tracing()
+    assert "KiB" in (profile_dir / "own.alloc.txt").read_text(encoding="utf-8")
+
+
+def test_tracing_started_elsewhere_is_left_running_with_its_peak(profile_dir):
+    tracemalloc.start()
+    try:
+        held = allocate()
+        del held
+        peak_before = tracemalloc.get_traced_memory()[1]
+
+        with profiling.profiled("shared"):
+            pass
+
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= peak_before
+        assert "not measured" in (profile_dir / "shared.alloc.txt").read_text(encoding="utf-8")
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,48 @@
+"""Render pool start-up, with a stand-in executor instead of worker processes."""
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from utils import render_bot
+
+
+class FailingPool:
+    """Every worker dies while starting, like one whose initializer raises."""
+
+    instances = []
+
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        self.shut_down = False
+        FailingPool.instances.append(self)
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture(autouse=True)
+def failing_pool(monkeypatch):
+    FailingPool.instances = []
+    monkeypatch.setattr(render_bot, "ProcessPoolExecutor", FailingPool)
+    monkeypatch.setattr(render_bot, "render_pool", None)
+
+
+def test_pool_whose_workers_fail_to_start_is_shut_down():
+    for _ in range(2):  # e.g. service warm-up retries
+        with pytest.raises(BrokenProcessPool):
+            render_bot.initialize_render_pool(max_workers=2)
+
+    assert len(FailingPool.instances) == 2
+    assert all(pool.shut_down for pool in FailingPool.instances)
+    assert render_bot.render_pool is None
+
+
+def test_pool_started_without_waiting_is_kept_for_the_first_render_to_replace():
+    pool = render_bot.initialize_render_pool(max_workers=2, wait=False)
+
+    assert render_bot.render_pool is pool and not pool.shut_down
@@ -0,0 +1,90 @@
+"""run_trips through to the bulk insert, with the in-process service stand-ins."""
+import asyncio
+import copy
+import json
+from datetime import datetime
+
+import pytest
+
+import main
+from benchmarks import stand_ins
+from utils import mongodb_bot, render_bot
+
+FIXED_NOW = datetime(2026, 10, 18, 4, 35, 4)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return FIXED_NOW
+
+
+def load_trip():
+    with open("data/itineraries.json", "r", encoding="utf-8") as f:
+        return json.load(f)["trips"][0]
+
+
+def trip_for(trip_id, itinerary_text):
+    trip = copy.deepcopy(load_trip())
+    trip.update(id=trip_id, itinerary_text=itinerary_text, stream=True)  # Streaming renders in this process
+    return trip
+
+
+def run(trips):
+    with open("data/contact.json", "r", encoding="utf-8") as f:
+        contact_info = json.load(f)
+    return asyncio.run(main.run_trips(trips, contact_info, asyncio.Semaphore(2), source="gcp"))
+
+
+@pytest.fixture(autouse=True)
+def services(monkeypatch):
+    stand_ins.install({"Day 1: Beach": "Day 1: Beach day", "Day 1: Hills": "Day 1: Hill walk"})
+    monkeypatch.setattr(main, "initialize_render_pool", lambda wait=True: None)
+    # Every render of the test finishes within the same second
+    monkeypatch.setattr(render_bot, "datetime", FrozenDatetime)
+
+
+def test_same_traveler_and_destination_in_the_same_second_are_both_stored(monkeypatch):
+    monkeypatch.setattr(main, "DETERMINISTIC_RENDER", False)
+
+    results = run([trip_for(1, "Day 1: Beach"), trip_for(2, "Day 1: Hills")])
+
+    assert [result["status"] for result in results] == ["success", "success"]
+    documents = mongodb_bot.collection.documents.values()
+    barcodes = {document["barcode_id"] for document in documents}
+    assert len(documents) == 2 and len(barcodes) == 2
+    assert all("ITIN-20261018043504-" in barcode for barcode in barcodes)
+
+
+def test_deterministic_repeat_in_one_batch_is_stored_once(monkeypatch):
+    monkeypatch.setattr(main, "DETERMINISTIC_RENDER", True)
+
+    results = run([trip_for(1, "Day 1: Beach"), trip_for(2, "Day 1: Beach"), trip_for(3, "Day 1: Hills")])
+
+    assert [result["status"] for result in results] == ["success", "success", "success"]
+    assert results[0]["mongo_id"] == results[1]["mongo_id"] != results[2]["mongo_id"]
+    assert len(mongodb_bot.collection.documents) == 2
+    assert len(mongodb_bot.pdf_bucket.files) == 2  # The repeat's GridFS file is removed
+
+
+def test_streamed_resubmission_reuses_the_stored_pdf(monkeypatch):
+    monkeypatch.setattr(main, "PDF_CACHE", True)
+    monkeypatch.setattr(main, "render_itinerary_pdf_async", None)  # A reused PDF is never rendered again
+
+    first = run([trip_for(1, "Day 1: Beach")])
+    again = run([trip_for(1, "Day 1: Beach")])
+
+    assert again[0]["status"] == "success"
+    assert again[0]["mongo_id"] == first[0]["mongo_id"]
+    assert len(mongodb_bot.collection.documents) == 1
+
+
+def test_render_pool_that_cannot_start_fails_no_trip_on_its_own(monkeypatch):
+    def broken_pool(wait=True):
+        raise OSError("can't start worker processes")
+
+    monkeypatch.setattr(main, "initialize_render_pool", broken_pool)
+
+    results = run([trip_for(1, "Day 1: Beach")])
+
+    assert results[0]["status"] == "success"
@@ -1,8 +1,27 @@
+import json
 import os
+import re
+import time
 
 import openai
 
-from utils.redis_bot import load_chatgpt_cache, save_chatgpt_cache, delete_chatgpt_cache
+from utils.metrics import count, span
+from utils.redis_bot import load_chatgpt_cache, save_chatgpt_cache, delete_chatgpt_cache, \
+    acquire_generation_lock, release_generation_lock, wait_for_chatgpt_cache
+
+# How many times a follower re-checks for a leader before generating on its own
+MAX_LEADER_WAITS = 3
+
+# Batch jobs: OpenAI finishes them within the completion window, usually much sooner
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = int(os.getenv("CHATGPT_BATCH_POLL_INTERVAL", "30"))
+# Expired and cancelled batches still return whatever finished before they stopped
+BATCH_FINAL_STATUSES = ("completed", "expired", "cancelled", "failed")
+FAILURE_NOTE = "\n\n(Note: ChatGPT enhancement failed)"
+
+# Lines that open a new block of the response when streaming ("Day 3:", "**Day 3:**", "## Packaging checklist")
+BLOCK_START = re.compile(r"^(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*(?:Day[ \t]+\d+[ \t]*:|Packaging checklist)", re.IGNORECASE | re.MULTILINE)
 
 
 def initialize_chatgpt():
@@ -20,35 +39,249 @@ def enhance_itinerary_with_chatgpt(itinerary_text, cache_flag=True):
     else:
         delete_chatgpt_cache(itinerary_text)
 
+    lock_token, leader_result = _acquire_or_wait(itinerary_text)
+    if leader_result:
+        return leader_result
+
+    try:
+        return _generate_itinerary(itinerary_text)
+    finally:
+        if lock_token:
+            release_generation_lock(itinerary_text, lock_token)
+
+def stream_itinerary_with_chatgpt(itinerary_text, cache_flag=True):
+    """Yield the enhanced itinerary block by block (header, each Day n:, checklist) as it is generated."""
+    if cache_flag:
+        chatgpt_cache = load_chatgpt_cache(itinerary_text)
+        if chatgpt_cache:
+            yield from split_itinerary_blocks(chatgpt_cache)
+            return
+    else:
+        delete_chatgpt_cache(itinerary_text)
+
+    lock_token, leader_result = _acquire_or_wait(itinerary_text)
+    if leader_result:
+        yield from split_itinerary_blocks(leader_result)
+        return
+
+    try:
+        yield from _stream_itinerary(itinerary_text)
+    finally:
+        if lock_token:
+            release_generation_lock(itinerary_text, lock_token)
+
+def split_itinerary_blocks(text):
+    starts = [m.start() for m in BLOCK_START.finditer(text) if m.start() > 0]
+    bounds = [0] + starts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b]]
+
+def _acquire_or_wait(itinerary_text):
+    # Single flight: one caller per itinerary talks to OpenAI, the others wait for its result
+    lock_token = None
+    for _ in range(MAX_LEADER_WAITS):
+        lock_token = acquire_generation_lock(itinerary_text)
+        if lock_token:
+            # A leader may have saved its result and released the lock since our cache miss
+            cached = load_chatgpt_cache(itinerary_text)
+            if cached:
+                release_generation_lock(itinerary_text, lock_token)
+                return None, cached
+            break
+        print("⏳ Same itinerary is already being generated, waiting for it")
+        leader_result = wait_for_chatgpt_cache(itinerary_text)
+        if leader_result:
+            return None, leader_result
+    return lock_token, None
+
+def _chat_request(itinerary_text):
     prompt = f"Convert the following travel itinerary into a detailed, user-friendly, structured version with day-wise highlights, engaging descriptions, travel tips, local experiences, and a packing checklist at the end.\n\n{itinerary_text}"
+    return dict(
+        model="gpt-4o-mini",
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are a professional travel planner AI. "
+                    "Your responses must follow this exact structure:\n\n"
+                    "Travel Itinerary: [Brief description of itinerary]\n"
+                    "Primary Traveller Name: [Name of the traveller in which this itinerary is booked]\n"
+                    "Travel Dates: [From and to dates in DD-MMM-YYYY format]\n"
+                    "Travelers: [Brief description of all travelers with any given info about travelers]\n"
+                    "Day n: [Brief about the day's event]\n"
+                    "Day wise highlights, travel tips and local experience (if any) if relevant\n"
+                    "Packaging checklist: [List of recommended items to pack]\n\n"
+                    "Do not include any extra commentary or headings. Just return the structured response."
+                )
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        max_tokens=int(len(itinerary_text) * 1.5)
+    )
+
+def _generate_itinerary(itinerary_text):
     try:
-        resp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a professional travel planner AI. "
-                        "Your responses must follow this exact structure:\n\n"
-                        "Travel Itinerary: [Brief description of itinerary]\n"
-                        "Primary Traveller Name: [Name of the traveller in which this itinerary is booked]\n"
-                        "Travel Dates: [From and to dates in DD-MMM-YYYY format]\n"
-                        "Travelers: [Brief description of all travelers with any given info about travelers]\n"
-                        "Day n: [Brief about the day's event]\n"
-                        "Day wise highlights, travel tips and local experience (if any) if relevant\n"
-                        "Packaging checklist: [List of recommended items to pack]\n\n"
-                        "Do not include any extra commentary or headings. Just return the structured response."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=int(len(itinerary_text) * 1.5)
-        )
+        with span("openai"):
+            resp = openai.chat.completions.create(**_chat_request(itinerary_text))
+        count("openai_calls")
+        _count_tokens(resp.usage)
         text = resp.choices[0].message.content
         save_chatgpt_cache(itinerary_text, text)
         return text
     except Exception as e:
-        return itinerary_text + "\n\n(Note: ChatGPT enhancement failed)"
+        count("openai_failures")
+        return itinerary_text + FAILURE_NOTE
+
+def _count_tokens(usage):
+    if usage is not None:
+        count("openai_prompt_tokens", usage.prompt_tokens)
+        count("openai_completion_tokens", usage.completion_tokens)
+
+def _stream_itinerary(itinerary_text):
+    text = ""
+    emitted = 0
+    failed = False
+    # Counted like _generate_itinerary; the span lasts until the last chunk, so it also
+    # covers the flowables the caller builds between blocks
+    with span("openai"):
+        try:
+            # The usage arrives on one last chunk, without choices
+            stream = openai.chat.completions.create(
+                **_chat_request(itinerary_text), stream=True, stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                _count_tokens(getattr(chunk, "usage", None))
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                text += delta
+                # Everything before the last block start seen so far is complete
+                for match in BLOCK_START.finditer(text, emitted + 1):
+                    yield text[emitted:match.start()]
+                    emitted = match.start()
+            count("openai_calls")
+        except Exception as e:
+            count("openai_failures")
+            failed = True
+    if failed:
+        yield (text[emitted:] + FAILURE_NOTE) if emitted else (itinerary_text + FAILURE_NOTE)
+        return
+
+    if text[emitted:]:
+        yield text[emitted:]
+    save_chatgpt_cache(itinerary_text, text)
+
+# ======= Batch generation =======
+class OpenAIBatchClient:
+    """Runs a JSONL batch job through the OpenAI Batch API."""
+
+    def submit(self, jsonl: bytes) -> str:
+        batch_file = openai.files.create(file=("itineraries.jsonl", jsonl), purpose="batch")
+        batch = openai.batches.create(
+            input_file_id=batch_file.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return openai.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> list[dict]:
+        # Successful and failed requests come back in separate files, in no particular order
+        batch = openai.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(openai.files.content(file_id).text.splitlines())
+        return [json.loads(line) for line in lines if line.strip()]
+
+class LocalBatchClient:
+    """Same interface, run in-process one request at a time; complete(body) returns the response text.
+
+    Stands in for the Batch API in tests (pass a fake complete) and where batch jobs aren't available.
+    """
+
+    def __init__(self, complete=None):
+        self.complete = complete or _complete_chat_request
+        self.batches = {}
+
+    def submit(self, jsonl: bytes) -> str:
+        batch_id = f"local_batch_{len(self.batches) + 1}"
+        self.batches[batch_id] = [json.loads(line) for line in jsonl.decode().splitlines() if line.strip()]
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed"
+
+    def results(self, batch_id: str) -> list[dict]:
+        results = []
+        for request in self.batches[batch_id]:
+            try:
+                content = self.complete(request["body"])
+                response = {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+                results.append({"custom_id": request["custom_id"], "response": response, "error": None})
+            except Exception as e:
+                results.append({"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}})
+        return results
+
+def _complete_chat_request(body):
+    return openai.chat.completions.create(**body).choices[0].message.content
+
+def build_batch_requests(itinerary_texts):
+    """JSONL batch input with one chat request per itinerary, and {custom_id: itinerary_text}."""
+    batch_requests = {f"itinerary-{n}": text for n, text in enumerate(itinerary_texts, 1)}
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": _chat_request(text)})
+        for custom_id, text in batch_requests.items()
+    ]
+    return ("\n".join(lines) + "\n").encode(), batch_requests
+
+def _batch_response_text(result):
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        return None
+    return response["body"]["choices"][0]["message"]["content"]
+
+def prefill_chatgpt_cache(itinerary_texts, client=None, poll_interval=None, timeout=None):
+    """Generate every itinerary the cache doesn't have yet in one batch job and cache the results.
+
+    Returns counts of cached (already there), generated and failed itineraries. Failed ones
+    stay uncached, so rendering falls back to a regular chat call for them.
+    """
+    client = client or OpenAIBatchClient()
+    poll_interval = BATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    summary = {"cached": 0, "generated": 0, "failed": 0}
+
+    missing = []
+    for text in dict.fromkeys(itinerary_texts):  # Unique, in input order
+        if load_chatgpt_cache(text):
+            summary["cached"] += 1
+        else:
+            missing.append(text)
+    if not missing:
+        return summary
+
+    jsonl, batch_requests = build_batch_requests(missing)
+    batch_id = client.submit(jsonl)
+    print(f"📦 Submitted ChatGPT batch {batch_id} with {len(batch_requests)} itineraries")
+
+    # No generation locks: a batch can take hours, far longer than a lock is meant to be held
+    deadline = time.monotonic() + timeout if timeout else None
+    status = client.status(batch_id)
+    while status not in BATCH_FINAL_STATUSES:
+        if deadline and time.monotonic() >= deadline:
+            raise TimeoutError(f"ChatGPT batch {batch_id} still {status} after {timeout} seconds")
+        time.sleep(poll_interval)
+        status = client.status(batch_id)
+    print(f"📦 ChatGPT batch {batch_id} {status}")
+
+    for result in client.results(batch_id) if status != "failed" else []:
+        text = batch_requests.pop(result.get("custom_id"), None)
+        content = _batch_response_text(result)
+        if text is None or not content:
+            continue
+        save_chatgpt_cache(text, content)
+        summary["generated"] += 1
+    summary["failed"] = len(missing) - summary["generated"]
+    return summary
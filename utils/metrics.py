@@ -0,0 +1,139 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+# One JSON object per line on stdout, which Cloud Logging ingests as structured entries
+METRICS_LOG = os.getenv("METRICS_LOG", "true").lower() == "true"
+
+# Scope the current code runs for (a request, or one trip of it). asyncio tasks and
+# asyncio.to_thread copy it, so spans in helper threads land in the right trip
+_current_scope = contextvars.ContextVar("metrics_scope", default=None)
+
+
+def _empty_stage():
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+class MetricsScope:
+    """Span durations and counters of one request or trip; child scopes roll up into summary()."""
+
+    def __init__(self, event, **fields):
+        self.event = event
+        self.fields = fields
+        self.stages = defaultdict(_empty_stage)
+        self.counters = defaultdict(int)
+        self.children = []
+        self.wall_ms = None
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, ms):
+        with self._lock:
+            _add_stages(self.stages, {stage: {"count": 1, "total_ms": ms, "max_ms": ms}})
+
+    def add_count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def merge(self, other):
+        """Add a summary() taken elsewhere, e.g. in a render worker process."""
+        with self._lock:
+            _add_stages(self.stages, other["stages"])
+            _add_counters(self.counters, other["counters"])
+
+    def summary(self):
+        stages = defaultdict(_empty_stage)
+        counters = defaultdict(int)
+        for scope in [self, *self.children]:
+            with scope._lock:
+                _add_stages(stages, scope.stages)
+                _add_counters(counters, scope.counters)
+        summary = {
+            "stages": {stage: {k: round(v, 2) for k, v in entry.items()} for stage, entry in stages.items()},
+            "counters": dict(counters),
+        }
+        if self.children:
+            summary["trips"] = len(self.children)
+        if self.wall_ms is not None:
+            summary["wall_ms"] = round(self.wall_ms, 2)
+        return summary
+
+
+def _add_stages(stages, other):
+    for stage, entry in other.items():
+        target = stages[stage]
+        target["count"] += entry["count"]
+        target["total_ms"] += entry["total_ms"]
+        target["max_ms"] = max(target["max_ms"], entry["max_ms"])
+
+def _add_counters(counters, other):
+    for name, value in other.items():
+        counters[name] += value
+
+def log_event(event, **fields):
+    if METRICS_LOG:
+        # One write per line, so lines from concurrent trips don't interleave
+        line = json.dumps({"severity": "INFO", "event": event, **fields}, ensure_ascii=False, default=str)
+        print(line + "\n", end="", flush=True)
+
+@contextlib.contextmanager
+def metrics_scope(event, **fields):
+    """Collect spans and counters until the block ends, then log them as one line.
+
+    A scope opened inside another becomes its child (a trip inside a request).
+    """
+    scope = MetricsScope(event, **fields)
+    parent = _current_scope.get()
+    if parent is not None:
+        with parent._lock:
+            parent.children.append(scope)
+    token = _current_scope.set(scope)
+    start = time.perf_counter()
+    try:
+        yield scope
+    finally:
+        scope.wall_ms = (time.perf_counter() - start) * 1000
+        _current_scope.reset(token)
+        log_event(event, **fields, **scope.summary())
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the block as one stage of the current scope and log it. Outside any scope it does nothing."""
+    scope = _current_scope.get()
+    if scope is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        scope.add_span(stage, ms)
+        log_event("span", stage=stage, ms=round(ms, 2), **scope.fields)
+
+def count(name, value=1):
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.add_count(name, value)
+
+def current_fields():
+    scope = _current_scope.get()
+    return dict(scope.fields) if scope is not None else {}
+
+@contextlib.contextmanager
+def worker_scope(**fields):
+    """Scope for work done in another process; send its summary() back and merge_metrics() it there."""
+    scope = MetricsScope("worker", **fields)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+def merge_metrics(summary):
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.merge(summary)
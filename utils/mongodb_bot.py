@@ -1,34 +1,197 @@
 import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, UTC
+from io import BytesIO
 
-from pymongo import MongoClient
+from bson import ObjectId
+from gridfs import GridFSBucket
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import BulkWriteError
+
+from utils.metrics import count, span
+
+PDF_RERENDER_DIR = "pdfs_from_db"
+# "gridfs" stores PDFs as chunked files; "inline" keeps the old pdf_data field
+PDF_STORAGE = os.getenv("PDF_STORAGE", "gridfs").lower()
+PDF_BUCKET_NAME = "itinerary_pdfs"
+REPRINT_WORKERS = int(os.getenv("REPRINT_WORKERS", "8"))
+# trip_dates look like "03 Feb 2026 - 08 Feb 2026"
+TRIP_DATE_FORMAT = "%d %b %Y"
+
+# Everything lookups need except the PDF itself, which is loaded once a match is confirmed
+METADATA_PROJECTION = {
+    "barcode_id": 1,
+    "traveler_name": 1,
+    "destination": 1,
+    "trip_title": 1,
+    "trip_dates": 1,
+    "trip_start": 1,
+    "created_at": 1,
+    "content_hash": 1,
+    "pdf_file_id": 1,
+}
+
+INDEXES = [
+    IndexModel([("barcode_id", ASCENDING)]),
+    IndexModel([("created_at", DESCENDING)]),
+    IndexModel([("traveler_name", ASCENDING), ("destination", ASCENDING)]),
+    IndexModel([("destination", ASCENDING), ("trip_start", ASCENDING)]),
+    IndexModel([("content_hash", ASCENDING)]),
+]
+
+db = None
+collection = None
+pdf_bucket = None
+_init_lock = threading.Lock()
 
 
 def initialize_mongodb():
-    global db, collection, PDF_RERENDER_DIR
+    global db, collection, pdf_bucket
     client = MongoClient(os.getenv("MONGODB_URI"))
     db = client[os.getenv("MONGODB_DB_NAME")]
     collection = db[os.getenv("MONGODB_COLLECTION_NAME")]
-    PDF_RERENDER_DIR = "pdfs_from_db"
-    os.makedirs(PDF_RERENDER_DIR, exist_ok=True)
+    pdf_bucket = GridFSBucket(db, bucket_name=PDF_BUCKET_NAME)
+    # Idempotent, one round trip; reprint lookups would otherwise scan the collection
+    collection.create_indexes(INDEXES)
+
+def get_collection():
+    # Connected on first use so importing this module never touches the network
+    if collection is None:
+        with _init_lock:
+            if collection is None:
+                initialize_mongodb()
+    return collection
+
+def get_db():
+    if db is None:
+        with _init_lock:
+            if db is None:
+                initialize_mongodb()
+    return db
+
+def get_pdf_bucket():
+    if pdf_bucket is None:
+        with _init_lock:
+            if pdf_bucket is None:
+                initialize_mongodb()
+    return pdf_bucket
 
-def load_data_to_mongodb(barcode_data, traveler_name, destination, trip_title, trip_dates, pdf_bytes):
-    # Prepare metadata
+def parse_trip_start(trip_dates):
+    """First day of trip_dates as a UTC datetime, or None if it can't be read."""
+    try:
+        return datetime.strptime(trip_dates.split("-")[0].strip(), TRIP_DATE_FORMAT).replace(tzinfo=UTC)
+    except (AttributeError, ValueError):
+        return None
+
+def build_pdf_record(barcode_data, traveler_name, destination, trip_title, trip_dates, pdf_bytes, content_hash=None):
+    """Metadata document for one PDF, ready to insert. The _id is generated here, so it is known before the write."""
     record = {
+        "_id": ObjectId(),
         "barcode_id": barcode_data,
         "traveler_name": traveler_name,
         "destination": destination,
         "trip_title": trip_title,
         "trip_dates": trip_dates,
+        "trip_start": parse_trip_start(trip_dates),  # Tour groups are reprinted by travel date
         "created_at": datetime.now(UTC),
-        "pdf_data": pdf_bytes  # Stored as binary
+        "content_hash": content_hash,  # Lets identical re-submissions reuse this PDF
     }
 
-    # Insert into MongoDB
-    return collection.insert_one(record)
+    if PDF_STORAGE == "inline":
+        record["pdf_data"] = pdf_bytes  # Stored as binary
+    else:
+        # Chunked storage keeps the metadata document small and clear of the 16 MB limit
+        record["pdf_file_id"] = upload_pdf_to_gridfs(barcode_data, pdf_bytes)
+    return record
+
+def load_data_to_mongodb(barcode_data, traveler_name, destination, trip_title, trip_dates, pdf_bytes, content_hash=None):
+    record = build_pdf_record(barcode_data, traveler_name, destination, trip_title, trip_dates, pdf_bytes, content_hash)
+    try:
+        with span("mongo_insert"):
+            return get_collection().insert_one(record)
+    except Exception:
+        delete_pdf_file(record)  # Don't leave orphaned chunks behind
+        raise
+
+def insert_pdf_records(records):
+    """Write prepared records with one unordered bulk insert.
+
+    Returns {_id: error message} for the records that were not written; the rest are stored.
+    """
+    if not records:
+        return {}
+    failed = {}
+    try:
+        with span("mongo_insert"):
+            get_collection().insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: every other record was still attempted, so only these are missing
+        for error in e.details.get("writeErrors", []):
+            failed[records[error["index"]]["_id"]] = error.get("errmsg", "write failed")
+    except Exception as e:
+        # Network error or timeout: any record the server doesn't confirm counts as not written
+        written = _written_ids(records)
+        failed = {record["_id"]: str(e) for record in records if record["_id"] not in written}
+    for record in records:
+        if record["_id"] in failed:
+            delete_pdf_file(record)
+    if failed:
+        count("mongo_insert_failures", len(failed))
+    return failed
+
+def _written_ids(records):
+    try:
+        cursor = get_collection().find({"_id": {"$in": [record["_id"] for record in records]}}, {"_id": 1})
+        return {document["_id"] for document in cursor}
+    except Exception:
+        return set()
+
+def delete_pdf_file(record):
+    # Best effort: a failed cleanup must not hide the error that caused it
+    if record.get("pdf_file_id") is not None:
+        try:
+            get_pdf_bucket().delete(record["pdf_file_id"])
+        except Exception as e:
+            print(f"⚠️ Could not delete GridFS file {record['pdf_file_id']}: {e}")
+
+def upload_pdf_to_gridfs(barcode_data, pdf_source):
+    # pdf_source may be bytes or a readable file object; GridFS reads it chunk by chunk
+    with span("gridfs_upload"):
+        return get_pdf_bucket().upload_from_stream(
+            f"{barcode_data}.pdf",
+            pdf_source,
+            metadata={"contentType": "application/pdf", "barcode_id": barcode_data}
+        )
+
+def find_pdf_by_content_hash(content_hash):
+    # Metadata only; the PDF itself is streamed by write_stored_pdf if it is needed
+    with span("pdf_lookup"):
+        return get_collection().find_one({"content_hash": content_hash}, METADATA_PROJECTION)
+
+def find_pdf_by_barcode(barcode_id):
+    # Barcode ids are kept unique, but older data may hold a barcode twice: take the newest
+    with span("pdf_lookup"):
+        return get_collection().find_one({"barcode_id": barcode_id}, METADATA_PROJECTION, sort=[("created_at", DESCENDING)])
+
+def open_stored_pdf(record):
+    """Readable stream over a stored PDF, whichever way it was stored."""
+    if record.get("pdf_file_id") is not None:
+        return get_pdf_bucket().open_download_stream(record["pdf_file_id"])
+    pdf_bytes = record.get("pdf_data")
+    if pdf_bytes is None:
+        pdf_bytes = get_collection().find_one({"_id": record["_id"]}, {"pdf_data": 1})["pdf_data"]
+    return BytesIO(pdf_bytes)
+
+def write_stored_pdf(record, pdf_path):
+    # Stream to file without holding the whole PDF in memory
+    with open_stored_pdf(record) as source, open(pdf_path, "wb") as f:
+        shutil.copyfileobj(source, f)
 
 def fetch_pdf_from_mongodb(barcode_id):
-    record = collection.find_one({"barcode_id": barcode_id})
+    record = find_pdf_by_barcode(barcode_id)
 
     if not record:
         raise ValueError(f"No PDF found for barcode_id: {barcode_id}")
@@ -42,17 +205,126 @@ def fetch_pdf_from_mongodb(barcode_id):
 
     # Build filename
     pdf_file_name = f"{destination}_{start_date}_{end_date}_reprint.pdf"
+    os.makedirs(PDF_RERENDER_DIR, exist_ok=True)
     pdf_path = os.path.join(PDF_RERENDER_DIR, pdf_file_name)
 
-    pdf_bytes = record["pdf_data"]
-
-    # Write to file
-    with open(pdf_path, "wb") as f:
-        f.write(pdf_bytes)
+    write_stored_pdf(record, pdf_path)
 
     print(f"PDF re-rendered at: {pdf_path}")
 
+def find_stored_pdfs(barcode_ids=None, destination=None, trip_from=None, trip_to=None):
+    """One cursor over the metadata of every matching PDF, oldest first.
+
+    trip_from and trip_to bound the trip's start date (trip_from <= start < trip_to).
+    """
+    query = {}
+    if barcode_ids:
+        query["barcode_id"] = {"$in": list(barcode_ids)}
+    if destination:
+        query["destination"] = destination
+    if trip_from or trip_to:
+        query["trip_start"] = {}
+        if trip_from:
+            query["trip_start"]["$gte"] = trip_from
+        if trip_to:
+            query["trip_start"]["$lt"] = trip_to
+    if not query:
+        raise ValueError("Give barcode ids, a destination or a trip start range")
+    return get_collection().find(query, METADATA_PROJECTION).sort("created_at", ASCENDING)
+
+def _reprint_file_name(record):
+    # Barcodes carry traveler, destination and time, so a tour group's files don't collide
+    barcode_id = record.get("barcode_id") or str(record["_id"])
+    return f"{barcode_id.replace('/', '_')}_reprint.pdf"
+
+def _reprint_file_names(records):
+    # A barcode stored twice (older data) gets the record id added instead of overwriting the first file
+    used = set()
+    for record in records:
+        name = _reprint_file_name(record)
+        if name in used:
+            name = name.replace("_reprint.pdf", f"_{record['_id']}_reprint.pdf")
+        used.add(name)
+        yield record, name
+
+def reprint_pdfs(records, output_dir=PDF_RERENDER_DIR, workers=None):
+    """Write each stored PDF to its own file, several at a time. Returns the written paths."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    def write_one(record_and_name):
+        record, name = record_and_name
+        pdf_path = os.path.join(output_dir, name)
+        write_stored_pdf(record, pdf_path)
+        return pdf_path
+
+    # Records are metadata only; each worker streams one PDF at a time from storage
+    with ThreadPoolExecutor(max_workers=workers or REPRINT_WORKERS) as pool:
+        paths = list(pool.map(write_one, _reprint_file_names(records)))
+    print(f"PDFs re-rendered: {len(paths)} in {output_dir}")
+    return paths
+
+def reprint_pdfs_to_zip(records, zip_path):
+    """Stream every stored PDF into one zip archive, one PDF in memory at a time. Returns the count."""
+    os.makedirs(os.path.dirname(zip_path) or ".", exist_ok=True)
+    written = 0
+    # PDFs are already compressed; storing them as-is keeps the archive cheap to build
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for record, name in _reprint_file_names(records):
+            with open_stored_pdf(record) as source, archive.open(name, "w", force_zip64=True) as target:
+                shutil.copyfileobj(source, target)
+            written += 1
+    print(f"PDFs re-rendered: {written} into {zip_path}")
+    return written
+
+def migrate_inline_pdfs_to_gridfs(limit=None, dry_run=False):
+    """Move inline pdf_data of existing documents into GridFS chunks."""
+    collection = get_collection()
+    query = {"pdf_data": {"$exists": True}}
+    # Walk ids only; each PDF is loaded by itself so memory stays at one document
+    cursor = collection.find(query, {"_id": 1, "barcode_id": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+
+    migrated = 0
+    for doc in cursor:
+        if dry_run:
+            migrated += 1
+            continue
+        pdf_bytes = collection.find_one({"_id": doc["_id"]}, {"pdf_data": 1})["pdf_data"]
+        file_id = upload_pdf_to_gridfs(doc.get("barcode_id") or str(doc["_id"]), pdf_bytes)
+        result = collection.update_one(
+            {"_id": doc["_id"], "pdf_data": {"$exists": True}},
+            {"$set": {"pdf_file_id": file_id}, "$unset": {"pdf_data": ""}}
+        )
+        if result.modified_count != 1:
+            get_pdf_bucket().delete(file_id)  # Migrated concurrently by someone else
+            continue
+        migrated += 1
+        print(f"📦 Moved PDF of {doc['_id']} into GridFS ({len(pdf_bytes)} bytes)")
+
+    return migrated
+
+def backfill_trip_starts(limit=None, dry_run=False):
+    """Set trip_start on documents stored before it was recorded, so travel date reprints find them."""
+    collection = get_collection()
+    cursor = collection.find({"trip_start": {"$exists": False}}, {"_id": 1, "trip_dates": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+
+    updated = 0
+    for doc in cursor:
+        trip_start = parse_trip_start(doc.get("trip_dates"))
+        if trip_start is None:
+            print(f"⚠️ Can't read trip dates of {doc['_id']}: {doc.get('trip_dates')!r}")
+        if not dry_run:
+            # Stored even when unreadable, so the next run doesn't look at it again
+            collection.update_one({"_id": doc["_id"]}, {"$set": {"trip_start": trip_start}})
+        updated += 1
+
+    return updated
+
 def delete_all_documents():
+    db = get_db()
     collections = db.list_collection_names()
     for name in collections:
         result = db[name].delete_many({})
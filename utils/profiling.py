@@ -0,0 +1,84 @@
+import contextlib
+import cProfile
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+# Share of renders profiled (0.0-1.0); 0 turns profiling off entirely
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "30"))
+
+# tracemalloc is process-wide: it runs while any profiled render in this process does.
+# Tracing started elsewhere (a benchmark, an operator) is never stopped or reset here
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def sample_profile(trip_id, content_hash):
+    """File name stem if this render is sampled for profiling, else None."""
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    return f"{time.strftime('%Y%m%d-%H%M%S')}_trip{trip_id}_{content_hash[:12]}"
+
+@contextlib.contextmanager
+def profiled(tag):
+    """cProfile stats and top tracemalloc allocations of the block, written to PROFILE_DIR/<tag>.*
+
+    A None tag (not sampled) runs the block as is.
+    """
+    if tag is None:
+        yield
+        return
+
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+        owned = _tracemalloc_owned
+    if owned:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        # Profiling must never fail the render it watches, e.g. on a read-only PROFILE_DIR
+        try:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                # Someone else's peak covers more than this block, so it isn't reported
+                peak = tracemalloc.get_traced_memory()[1] if owned else None
+            finally:
+                with _tracemalloc_lock:
+                    _tracemalloc_users -= 1
+                    if _tracemalloc_users == 0 and _tracemalloc_owned:
+                        tracemalloc.stop()
+                        _tracemalloc_owned = False
+            _write_profile(tag, profiler, snapshot, peak)
+        except Exception as e:
+            print(f"⚠️ Profile {tag} not written: {e}")
+
+def _write_profile(tag, profiler, snapshot, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats_path = os.path.join(PROFILE_DIR, f"{tag}.prof")
+    profiler.dump_stats(stats_path)  # python -m pstats <file>, or snakeviz
+
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    alloc_path = os.path.join(PROFILE_DIR, f"{tag}.alloc.txt")
+    with open(alloc_path, "w", encoding="utf-8") as f:
+        if peak is None:
+            f.write("Peak traced memory: not measured, tracemalloc was started outside the profiler\n")
+        else:
+            f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+        f.write(f"Top {PROFILE_TOP_ALLOCATIONS} allocations still held at the end, by line:\n")
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+    print(f"🔬 Profile written: {stats_path}, {alloc_path}")
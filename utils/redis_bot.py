@@ -2,9 +2,41 @@ import hashlib
 import json
 import os
 import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
 
 import redis
 
+from utils.metrics import count, span
+
+CHATGPT_CACHE_TTL = 5184000  # 60 days in Redis
+MEMORY_CACHE_SIZE = int(os.getenv("CHATGPT_MEMORY_CACHE_SIZE", "256"))
+MEMORY_CACHE_TTL = int(os.getenv("CHATGPT_MEMORY_CACHE_TTL", "3600"))
+COMPRESSED_PREFIX = b"zlib:"
+# Generation lock: must outlive a normal OpenAI call, expires if the leader dies
+GENERATION_LOCK_TTL = int(os.getenv("CHATGPT_LOCK_TTL", "120"))
+GENERATION_POLL_INTERVAL = 0.25
+
+# Delete the lock only if we still own it, so a leader whose lock already
+# expired can't release the lock of the leader that replaced it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+redis_client = None
+_init_lock = threading.Lock()
+
+# In-process tier in front of Redis: key -> (expires_at, response), oldest first
+memory_cache = OrderedDict()
+cache_stats = {"memory_hits": 0, "memory_misses": 0, "redis_hits": 0, "redis_misses": 0}
+_memory_lock = threading.Lock()
+
 def initialize_redis():
     global redis_client
     redis_client = redis.Redis(
@@ -15,24 +47,119 @@ def initialize_redis():
         password=os.getenv("REDIS_PASSWORD"),
     )
 
+def get_redis_client():
+    # Created on first use so importing this module never touches the network
+    if redis_client is None:
+        with _init_lock:
+            if redis_client is None:
+                initialize_redis()
+    return redis_client
+
+# ======= In-process tier =======
+def _memory_get(key):
+    with _memory_lock:
+        entry = memory_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            memory_cache.move_to_end(key)
+            cache_stats["memory_hits"] += 1
+            return entry[1]
+        if entry:
+            del memory_cache[key]  # expired
+        cache_stats["memory_misses"] += 1
+        return None
+
+def _memory_set(key, value):
+    with _memory_lock:
+        memory_cache[key] = (time.monotonic() + MEMORY_CACHE_TTL, value)
+        memory_cache.move_to_end(key)
+        while len(memory_cache) > MEMORY_CACHE_SIZE:
+            memory_cache.popitem(last=False)
+
+def _memory_delete(key):
+    with _memory_lock:
+        memory_cache.pop(key, None)
+
+def get_cache_stats() -> dict:
+    with _memory_lock:
+        return dict(cache_stats)
+
+# ======= Redis value encoding =======
+def _encode_value(response_data) -> bytes:
+    return COMPRESSED_PREFIX + zlib.compress(json.dumps(response_data).encode(), 6)
+
+def _decode_value(raw: bytes):
+    # Values written before compression was introduced are plain JSON
+    if raw.startswith(COMPRESSED_PREFIX):
+        raw = zlib.decompress(raw[len(COMPRESSED_PREFIX):])
+    return json.loads(raw)
+
 # Load ChatGPT cache
 def load_chatgpt_cache(input_data: dict) -> dict | None:
     key = _hash_key(input_data)
     print("🔍 Hash key:", key)
-    cached = redis_client.get(key)
-    return json.loads(cached) if cached else None
+    cached = _memory_get(key)
+    if cached is not None:
+        count("chatgpt_cache_memory_hits")
+        return cached
+
+    with span("redis_lookup"):
+        raw = get_redis_client().get(key)
+    with _memory_lock:
+        cache_stats["redis_hits" if raw else "redis_misses"] += 1
+    count("chatgpt_cache_redis_hits" if raw else "chatgpt_cache_misses")
+    if not raw:
+        return None
+
+    cached = _decode_value(raw)
+    _memory_set(key, cached)
+    return cached
 
 # Save ChatGPT cache
 def save_chatgpt_cache(input_data: dict, response_data):
     key = _hash_key(input_data)
-    redis_client.set(key, json.dumps(response_data), ex=5184000)  # 60-day TTL
+    get_redis_client().set(key, _encode_value(response_data), ex=CHATGPT_CACHE_TTL)
+    _memory_set(key, response_data)
 
 def delete_chatgpt_cache(input_data: dict) -> bool:
     key = _hash_key(input_data)
-    result = redis_client.delete(key)
+    _memory_delete(key)
+    result = get_redis_client().delete(key)
     return result == 1  # Returns True if key was deleted, False if not found
 
 
+# ======= Single-flight generation =======
+def acquire_generation_lock(input_data: str) -> str | None:
+    """Try to become the one caller generating this itinerary; returns a lock token on success."""
+    token = uuid.uuid4().hex
+    acquired = get_redis_client().set(_lock_key(_hash_key(input_data)), token, nx=True, ex=GENERATION_LOCK_TTL)
+    return token if acquired else None
+
+def release_generation_lock(input_data: str, token: str) -> bool:
+    result = get_redis_client().eval(RELEASE_LOCK_SCRIPT, 1, _lock_key(_hash_key(input_data)), token)
+    return result == 1
+
+def wait_for_chatgpt_cache(input_data: str, timeout: float | None = None):
+    """Wait for the lock holder's response. Returns None if it finished without caching one."""
+    key = _hash_key(input_data)
+    lock_key = _lock_key(key)
+    client = get_redis_client()
+    deadline = time.monotonic() + (timeout or GENERATION_LOCK_TTL)
+
+    while time.monotonic() < deadline:
+        raw = client.get(key)
+        if not raw and not client.exists(lock_key):
+            # The leader saves before releasing, so look once more after the lock is gone
+            raw = client.get(key)
+            if not raw:
+                return None
+        if raw:
+            value = _decode_value(raw)
+            _memory_set(key, value)
+            return value
+        time.sleep(GENERATION_POLL_INTERVAL)
+    return None
+
+
 # ======= Utilities =======
 
 def normalize_text(text: str) -> str:
@@ -42,4 +169,7 @@ def normalize_text(text: str) -> str:
 
 def _hash_key(text: str) -> str:
     normalized = normalize_text(text)
-    return hashlib.sha256(normalized.encode()).hexdigest()
\ No newline at end of file
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def _lock_key(key: str) -> str:
+    return f"lock:{key}"
\ No newline at end of file
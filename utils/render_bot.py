@@ -0,0 +1,307 @@
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, UTC
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, Spacer, PageBreak, NextPageTemplate
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame
+
+from utils.metrics import count, current_fields, merge_metrics, span, worker_scope
+from utils.profiling import profiled
+from utils.reportlab_bot import generate_qr_code, draw_page_elements, markdown_to_html, html_to_story, \
+    add_coverpage, render_summary_section, draw_summary_page, build_pdf_memory
+from utils.styles import register_styles
+from utils.unsplash_bot import COVER_IMAGE_DPI, COVER_IMAGE_QUALITY
+
+# ======= Configuration =======
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+# Destination photo on the cover page (Unsplash, cached on disk)
+COVER_IMAGES = os.getenv("COVER_IMAGES", "false").lower() == "true"
+# Bump whenever the rendered output changes (layout, styles, fonts, images, page
+# drawing) so cached PDFs are not reused. 2: processed covers, form XObject chrome
+TEMPLATE_VERSION = "2"
+# Deterministic barcodes are dated on the trip's start date, or on this day if it can't be read
+DETERMINISTIC_EPOCH = int(datetime(2025, 1, 1, tzinfo=UTC).timestamp())
+
+render_pool = None
+_pool_lock = threading.Lock()
+stylesheet = None
+
+
+# ======= Styles (loaded once per process) =======
+def get_stylesheet():
+    global stylesheet
+    if stylesheet is None:
+        emoji_style, link_style, heading_style, sub_heading_style, day_style, normal_style, small_style, THEME_COLOR, EMOJI_COLOR = register_styles()
+
+        styles = getSampleStyleSheet()
+        styles.add(emoji_style)
+        styles.add(heading_style)
+        styles.add(sub_heading_style)
+        styles.add(day_style)
+        styles.add(normal_style)
+        styles.add(small_style)
+        stylesheet = (styles, link_style)
+    return stylesheet
+
+
+# ======= PDF Rendering =======
+def _create_document(pdf_path, traveler_name, destination, clock=None):
+    doc = BaseDocTemplate(
+        pdf_path,
+        pagesize=A4,
+        rightMargin=40,
+        leftMargin=40,
+        topMargin=60,
+        bottomMargin=40
+    )
+    frame = Frame(
+        doc.leftMargin,
+        doc.bottomMargin,
+        doc.width,
+        doc.height,
+        id='normal',
+        showBoundary=0  # Set to 1 if you want visible frame borders
+    )
+    template = PageTemplate(id='main', frames=[frame], onPage=draw_page_elements)
+    doc.addPageTemplates([template])
+
+    # Define a frame for the summary page
+    summary_frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='summary')
+
+    # Register the summary page template with your custom draw function
+    summary_template = PageTemplate(id='SummaryPage', frames=[summary_frame], onPage=draw_summary_page)
+
+    # Add it to the document
+    doc.addPageTemplates([summary_template])
+
+    # Add metadata for barcode
+    doc.traveler_name = traveler_name
+    doc.destination = destination
+
+    # Page decoration and barcode time come from the document, never from global state
+    doc.rng = random.Random()
+    doc.clock = clock or datetime.now
+    doc.barcode_suffix = secrets.token_hex(3)
+    return doc
+
+def _trip_start(trip_dates):
+    # "03 Feb 2026 - 08 Feb 2026" -> midnight UTC of 03 Feb 2026
+    try:
+        start = datetime.strptime(trip_dates.split("-")[0].strip(), "%d %b %Y")
+    except (AttributeError, ValueError):
+        return DETERMINISTIC_EPOCH
+    return int(start.replace(tzinfo=UTC).timestamp())
+
+def deterministic_render_args(content_hash, trip_dates=None):
+    """RNG seed and barcode clock derived from the content hash.
+
+    The barcode time is the trip's start date, at a time of day taken from the hash;
+    _make_deterministic also takes the barcode suffix from the hash, so other content
+    for the same trip gets another barcode.
+    """
+    seed = int(content_hash[:16], 16)
+    timestamp = _trip_start(trip_dates) + int(content_hash[16:24], 16) % 86400
+    return seed, functools.partial(datetime.fromtimestamp, timestamp, UTC)
+
+def _make_deterministic(doc, content_hash, trip_dates, clock=None):
+    # Same input -> same watermarks, barcode and PDF bytes (invariant fixes dates and document ID)
+    seed, hash_clock = deterministic_render_args(content_hash, trip_dates)
+    doc.rng.seed(seed)
+    doc.clock = clock or hash_clock
+    doc.barcode_suffix = content_hash[24:30]
+    doc.invariant = 1
+
+def _cover_story(doc, styles, trip_title, trip_dates, traveler_name, pax_details):
+    # ---- Cover Page ----
+    story = add_coverpage(doc, [], image_flag=COVER_IMAGES)
+
+    story.append(Paragraph(f"<b>{trip_title}</b>", styles["CenterHeading"]))
+    story.append(Paragraph(f"Dates: {trip_dates}", styles["CenterHeading"]))
+    story.append(Paragraph(f"Traveler: {traveler_name}", styles["CenterHeading"]))
+    story.append(Paragraph(f"Pax: {pax_details}", styles["CenterHeading"]))
+    story.append(Spacer(1, 30))
+    story.append(Paragraph("Powered by Travel Bureau", styles["CenterHeading"]))
+    story.append(PageBreak())
+    return story
+
+def _itinerary_story(detailed_itinerary, styles, state=None):
+    # ---- Itinerary Pages ----
+    # One HTML parse, inside html_to_story. Sanitizing and tightening bold punctuation
+    # only changed markup that html_to_story reads past (it takes the text of each block)
+    with span("markdown"):
+        html = markdown_to_html(detailed_itinerary)
+    with span("story"):
+        return html_to_story(html, styles, state)
+
+def _finish_pdf(doc, story, styles, link_style, tour_costs, inclusions, exclusions, contact_info):
+    # ---- Summary Page ----
+    story.append(NextPageTemplate("SummaryPage"))
+    qr_buffer = generate_qr_code(contact_info['website'])
+    render_summary_section(story, styles, tour_costs, inclusions, exclusions, contact_info, qr_buffer, doc, link_style)
+
+    # Lay the story out once; the same bytes go to disk and MongoDB
+    with span("build"):
+        pdf_bytes = build_pdf_memory(doc, story)
+    count("pages", doc.page)
+    count("pdf_bytes", len(pdf_bytes))
+
+    # Set by draw_summary_page during the build above, so it matches the stored PDF
+    barcode_metadata = getattr(doc, "barcode_metadata", None)
+    return pdf_bytes, barcode_metadata
+
+def render_itinerary_pdf(detailed_itinerary, pdf_path, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None, deterministic=False, clock=None):
+    styles, link_style = get_stylesheet()
+    doc = _create_document(pdf_path, traveler_name, destination, clock)
+    if deterministic:
+        _make_deterministic(doc, pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        ), trip_dates, clock)
+
+    story = _cover_story(doc, styles, trip_title, trip_dates, traveler_name, pax_details)
+    story.extend(_itinerary_story(detailed_itinerary, styles))
+
+    return _finish_pdf(doc, story, styles, link_style, tour_costs, inclusions, exclusions, contact_info)
+
+def render_itinerary_pdf_streaming(itinerary_blocks, pdf_path, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None, deterministic=False, clock=None):
+    """Build flowables for each itinerary block as it arrives; only doc.build waits for the last one.
+
+    Runs in the calling process (flowables can't be sent to the render pool) and also
+    returns the full enhanced text.
+    """
+    styles, link_style = get_stylesheet()
+    doc = _create_document(pdf_path, traveler_name, destination, clock)
+
+    story = _cover_story(doc, styles, trip_title, trip_dates, traveler_name, pax_details)
+    state = {}
+    blocks = []
+    for block in itinerary_blocks:
+        blocks.append(block)
+        story.extend(_itinerary_story(block, styles, state))
+    detailed_itinerary = "".join(blocks)
+
+    # The hash needs the full text, which is only known now; the RNG isn't used before doc.build
+    if deterministic:
+        _make_deterministic(doc, pdf_content_hash(
+            detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details,
+            tour_costs, inclusions, exclusions, contact_info, destination
+        ), trip_dates, clock)
+
+    pdf_bytes, barcode_metadata = _finish_pdf(doc, story, styles, link_style, tour_costs, inclusions, exclusions, contact_info)
+    return pdf_bytes, barcode_metadata, detailed_itinerary
+
+
+def pdf_content_hash(detailed_itinerary, trip_title, trip_dates, traveler_name, pax_details, tour_costs, inclusions, exclusions, contact_info, destination=None):
+    """Hash of everything that ends up in the PDF; equal hashes mean the stored PDF can be reused."""
+    content = {
+        "template_version": TEMPLATE_VERSION,
+        "itinerary": detailed_itinerary,
+        "trip_title": trip_title,
+        "trip_dates": trip_dates,
+        "traveler_name": traveler_name,
+        "pax": pax_details,
+        "tour_costs": tour_costs,
+        "inclusions": inclusions,
+        "exclusions": exclusions,
+        "contact_info": contact_info,
+        "destination": destination,
+        # Cover settings change the PDF as much as the content does
+        "cover_image": {"dpi": COVER_IMAGE_DPI, "quality": COVER_IMAGE_QUALITY} if COVER_IMAGES else None,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+# ======= Worker Pool =======
+def _init_render_worker():
+    # Runs once per worker process: fonts and styles stay loaded for every render
+    get_stylesheet()
+
+def _warm_up():
+    return os.getpid()
+
+def initialize_render_pool(max_workers=None, wait=True):
+    """Start the render pool once per process.
+
+    Every worker is started up front so no trip pays for font registration. wait=False
+    returns as soon as they are starting; a worker that fails to start then breaks the
+    pool, which the first render replaces.
+    """
+    global render_pool
+    # Locked so concurrent requests don't each start (and leak) a pool
+    if render_pool is None:
+        with _pool_lock:
+            if render_pool is None:
+                workers = max_workers or RENDER_WORKERS
+                # spawn keeps workers independent of the parent's threads and event loop
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_render_worker
+                )
+                warm_up = [pool.submit(_warm_up) for _ in range(workers)]
+                if wait:
+                    try:
+                        for future in warm_up:
+                            future.result()
+                    except Exception:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        raise
+                render_pool = pool
+                print(f"🖨️ Render pool {'ready' if wait else 'starting'} with {workers} workers")
+    return render_pool
+
+def render_pool_ready():
+    """True once the pool is up and none of its workers has died."""
+    pool = render_pool
+    return pool is not None and not pool._broken
+
+def reset_render_pool(broken_pool):
+    """Drop a pool whose worker died (e.g. OOM killed); the next render starts a fresh one."""
+    global render_pool
+    with _pool_lock:
+        if render_pool is broken_pool:
+            render_pool = None
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_render_pool():
+    global render_pool
+    with _pool_lock:
+        pool, render_pool = render_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _render_in_worker(metrics_fields, profile_tag, *args, **kwargs):
+    # Spans recorded in the worker travel back with the result, into the trip's metrics
+    with worker_scope(**metrics_fields) as scope, profiled(profile_tag):
+        result = render_itinerary_pdf(*args, **kwargs)
+    return result, scope.summary()
+
+async def render_itinerary_pdf_async(*args, profile_tag=None, **kwargs):
+    # Only the enhanced text and trip fields cross the process boundary.
+    # A profile_tag (see utils.profiling.sample_profile) profiles the render inside the worker
+    loop = asyncio.get_running_loop()
+    render = functools.partial(_render_in_worker, current_fields(), profile_tag, *args, **kwargs)
+    for attempt in range(2):
+        pool = await asyncio.to_thread(initialize_render_pool)
+        try:
+            result, worker_metrics = await loop.run_in_executor(pool, render)
+            break
+        except BrokenProcessPool:
+            # A broken pool fails every later submit too: replace it and retry once
+            print("⚠️ Render pool broken, restarting it")
+            await asyncio.to_thread(reset_render_pool, pool)
+            if attempt == 1:
+                raise
+    merge_metrics(worker_metrics)
+    return result
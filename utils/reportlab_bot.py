@@ -4,14 +4,14 @@ import random
 from datetime import datetime
 import emoji
 import qrcode
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
 from markdown2 import markdown
 from reportlab.graphics.barcode import code128
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import Paragraph, Table, TableStyle, PageBreak, Spacer, KeepTogether, Image
 
-from utils.unsplash_bot import fetch_image
+from utils.unsplash_bot import fetch_cover_image
 
 
 # ======= QR Code =======
@@ -38,6 +38,8 @@ def extract_toc_entries(html_text):
     return toc
 
 def draw_random_watermarks(canvas, doc):
+    # Per-document RNG (seeded in deterministic mode) instead of the shared global one
+    rng = getattr(doc, "rng", random)
     canvas.saveState()
     canvas.setFillColorRGB(0.95, 0.95, 0.95)  # Light gray for subtle watermark
     canvas.setFont("Symbola", 50)
@@ -45,42 +47,48 @@ def draw_random_watermarks(canvas, doc):
     emojis = ["✈", "🏝", "📸", "🌍", "🚗", "🗺", "🏨", "🍽",
               "🎒", "🚢", "🚂", "🚤", "🚃", "🚅", "🚁", "🛄"]
 
-    for _ in range(random.randint(4, 6)):  # Draw 5 random objects
-        emoji = random.choice(emojis)
-        x = random.randint(50, int(doc.pagesize[0]) - 50)
-        y = random.randint(100, int(doc.pagesize[1]) - 100)
+    for _ in range(rng.randint(4, 6)):  # Draw 5 random objects
+        emoji = rng.choice(emojis)
+        x = rng.randint(50, int(doc.pagesize[0]) - 50)
+        y = rng.randint(100, int(doc.pagesize[1]) - 100)
         canvas.drawString(x, y, emoji)
 
     canvas.restoreState()
 
 def draw_random_spaces(canvas, doc):
+    rng = getattr(doc, "rng", random)
     canvas.saveState()
     canvas.setFillColorRGB(0.95, 0.95, 0.95)  # Light gray for subtle watermark
     canvas.setFont("Symbola", 50)
 
     emojis = [" ", "  ", "   ", "    ", "     ", "      ",
               "       ", "        ", "         "]
-    for _ in range(random.randint(4, 6)):  # Draw 5 random objects
-        emoji = random.choice(emojis)
-        x = random.randint(50, int(doc.pagesize[0]) - 50)
-        y = random.randint(100, int(doc.pagesize[1]) - 100)
+    for _ in range(rng.randint(4, 6)):  # Draw 5 random objects
+        emoji = rng.choice(emojis)
+        x = rng.randint(50, int(doc.pagesize[0]) - 50)
+        y = rng.randint(100, int(doc.pagesize[1]) - 100)
         canvas.drawString(x, y, emoji)
 
     canvas.restoreState()
 
-def draw_page_elements(canvas, doc):
-    canvas.saveState()
+# Form XObjects hold the parts of a page that never change; each document records them once
+PAGE_BACKGROUND_FORM = "PageBackground"
+PAGE_CHROME_FORM = "PageChrome"
 
-    # --- Background color ---
+def draw_page_form(canvas, doc, name, draw):
+    # Recorded on the first page that needs it, referenced by name on every page after.
+    # Forms live in the PDF being written, so each document records its own
+    if not canvas.hasForm(name):
+        canvas.beginForm(name)
+        draw(canvas, doc)
+        canvas.endForm()
+    canvas.doForm(name)
+
+def draw_page_background(canvas, doc):
     canvas.setFillColor(colors.HexColor("#FBFCF7"))
     canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], stroke=0, fill=1)
 
-    # Watermarks
-    draw_random_watermarks(canvas, doc)
-
-    # Spaces
-    draw_random_spaces(canvas, doc)
-
+def draw_page_chrome(canvas, doc):
     # --- Header: Logo on left, Title on right ---
     canvas.setFont("Montserrat", 10)
     canvas.setFillColorRGB(0.2, 0.2, 0.2)
@@ -110,7 +118,6 @@ def draw_page_elements(canvas, doc):
     canvas.setFont("FiraSans", 8)
     canvas.setFillColorRGB(0.4, 0.4, 0.4)
     canvas.drawString(doc.leftMargin, 10, "www.travel-bureau.com | enjoy@travel-bureau.com")
-    canvas.drawRightString(doc.width + doc.leftMargin, 10, f"Page {canvas.getPageNumber()}")
 
     # --- Diagonal Watermark ---
     canvas.saveState()
@@ -139,6 +146,27 @@ def draw_page_elements(canvas, doc):
         doc.height + 20
     )
 
+def draw_page_elements(canvas, doc):
+    # Background, then the per-page random decorations, then header, footer and border on top
+    draw_page_form(canvas, doc, PAGE_BACKGROUND_FORM, draw_page_background)
+
+    canvas.saveState()
+
+    # Watermarks
+    draw_random_watermarks(canvas, doc)
+
+    # Spaces
+    draw_random_spaces(canvas, doc)
+
+    canvas.restoreState()
+
+    draw_page_form(canvas, doc, PAGE_CHROME_FORM, draw_page_chrome)
+
+    # --- Page number, the only chrome that changes ---
+    canvas.saveState()
+    canvas.setFont("FiraSans", 8)
+    canvas.setFillColorRGB(0.4, 0.4, 0.4)
+    canvas.drawRightString(doc.width + doc.leftMargin, 10, f"Page {canvas.getPageNumber()}")
     canvas.restoreState()
 
 def extract_day_titles(itinerary_text):
@@ -248,7 +276,24 @@ def render_cost_info_block(tour_costs, styles, max_width=420):
 def themed_heading(text, THEME_COLOR):
     return f'<font color="{THEME_COLOR}"><b>{text}</b></font>'
 
-def sanitize_html_for_pdf(markdown_text):
+# Emoji Symbola can't draw -> a symbol it can
+PDF_EMOJI_MAP = {
+    "📋": "✎", "🌟": "★", "📅": "⏰", "🧑": "👤", "👥": "👤 x2",
+    "🔗": "⇱", "🌐": "⛶", "🗓": "⏰", "📧": "✉", "📞": "☎", "✅": "✓", "❌": "✗"
+}
+# Emoji are non-ASCII except for a leading keycap base (#, *, 0-9), so only these runs can hold one
+NON_ASCII_RUN = re.compile(r"[#*0-9]?[^\x00-\x7f]+")
+INLINE_TAG_OPEN = re.compile(r"(?<!\s)(<[bi]>)")
+INLINE_TAG_CLOSE = re.compile(r"(</[bi]>)(?!\s)")
+
+def replace_pdf_emoji(text):
+    # Same result as running emoji.replace_emoji over the whole text, without scanning the ASCII bulk
+    return NON_ASCII_RUN.sub(
+        lambda run: emoji.replace_emoji(run.group(), replace=lambda e, pos: PDF_EMOJI_MAP.get(e, f"[{e}]")),
+        text
+    )
+
+def markdown_to_html(markdown_text):
     # Step 1: Convert Markdown to HTML
     html = markdown(markdown_text, extras=["fenced-code-blocks", "tables", "strike", "target-blank-links"])
 
@@ -257,11 +302,10 @@ def sanitize_html_for_pdf(markdown_text):
     html = html.replace("<em>", "<i>").replace("</em>", "</i>")
 
     # Step 3: Replace emojis with safe symbols
-    emoji_map = {
-        "📋": "✎", "🌟": "★", "📅": "⏰", "🧑": "👤", "👥": "👤 x2",
-        "🔗": "⇱", "🌐": "⛶", "🗓": "⏰", "📧": "✉", "📞": "☎", "✅": "✓", "❌": "✗"
-    }
-    html = emoji.replace_emoji(html, replace=lambda e, pos: emoji_map.get(e, f"[{e}]"))
+    return replace_pdf_emoji(html)
+
+def sanitize_html_for_pdf(markdown_text):
+    html = markdown_to_html(markdown_text)
 
     # Step 4: Clean up spacing and unsupported tags
     soup = BeautifulSoup(html, "html.parser")
@@ -278,24 +322,138 @@ def sanitize_html_for_pdf(markdown_text):
     return str(soup)
 
 def fix_inline_spacing(html):
-    # Add space before and after <b> and </b> if needed
-    html = re.sub(r'(?<!\s)<b>', ' <b>', html)
-    html = re.sub(r'</b>(?!\s)', '</b> ', html)
-
-    # Same for <i>
-    html = re.sub(r'(?<!\s)<i>', ' <i>', html)
-    html = re.sub(r'</i>(?!\s)', '</i> ', html)
-
-    return html
+    # Add space before <b>/<i> and after </b>/</i> if needed
+    if "<" not in html:
+        return html
+    html = INLINE_TAG_OPEN.sub(r" \1", html)
+    return INLINE_TAG_CLOSE.sub(r"\1 ", html)
 
 def tighten_bold_punctuation(html):
     # Move trailing punctuation into <b> tags
     return re.sub(r'<b>([^<]+?)</b>([.,!?])', r'<b>\1\2</b>', html)
 
-def html_to_story(html_text, styles):
+# ======= Itinerary line classifier =======
+# Header fields are shown on the cover, not repeated in the itinerary pages
+TOP_FIELD_PREFIXES = ("Travel Itinerary:", "Primary Traveller Name:", "Travel Dates:", "Travelers:")
+DAY_HEADING = re.compile(r"Day\s+\d+:")
+NOTE_LABEL = re.compile(r"(?i)\bnote:")
+
+TIME_OF_DAY_LABELS = r"Morning|Afternoon|Evening|Night|Early Morning|Early Afternoon|Late Afternoon|All Day|" \
+                     r"Full Day|Morning till Evening|Late Evening|All day|Late Night"
+TIME_RANGE_LABELS = r"Morning|Afternoon|Evening|Night|All Day|Full day"
+
+# (line type, pattern at the start of the line), in priority order: the first type that matches wins
+LINE_TYPES = [
+    ("time_of_day", rf"(?P<time_label>{TIME_OF_DAY_LABELS}):\s*(?P<time_text>.*)"),
+    ("time_range", rf"(?P<range_from>{TIME_RANGE_LABELS})"
+                   rf"(?:\s*(?P<range_connector>to|&|and)\s*(?P<range_to>{TIME_RANGE_LABELS}))?:\s*(?P<range_text>.*)"),
+    ("accommodation", r"Accommodation:\s*(?P<accommodation_text>.*)"),
+    ("summary", r"day[-\s]?wise.*:|time[-\s]?wise.*:|time[-\s]?split.*:"),
+    ("highlight", r"highlight|day highlight|day-highlight"),
+    ("travel_tip", r"travel tip|tip"),
+    ("local_experience", r"local experience"),
+    ("checklist", r"packaging checklist"),
+]
+# One compiled alternation: a single match both classifies the line (lastgroup) and captures its parts
+LINE_CLASSIFIER = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in LINE_TYPES), re.IGNORECASE)
+
+TIME_EMOJIS = {
+    "Morning:": "🌄",
+    "Early Morning:": "🌄",
+    "Afternoon:": "🌞",
+    "Early Afternoon:": "🌅",
+    "Evening:": "🌆",
+    "Late Evening:": "🌃",
+    "Night:": "🌠",
+    "Late Afternoon:": "🫖",
+    "Late Night:": "🌌",
+    "All Day:": "📆",
+    "Full Day:": "📅",
+    "Morning Till Evening:": "🌕"
+}
+# Labelled sections: line type -> label paragraph shown before the text after the colon
+SECTION_LABELS = {
+    "highlight": "<i>📸 Highlight:</i>",
+    "travel_tip": "<i>💡 Travel Tips:</i>",
+    "local_experience": "<i>🎯 Local Experience:</i>",
+}
+
+UNWRAPPED_TAGS = ("span", "div")
+PUNCTUATION_AFTER_BOLD = (".", ",", "!", "?")
+
+def list_item_text(li, is_empty):
+    """li.get_text(strip=True) as it was after sanitize_html_for_pdf and tighten_bold_punctuation.
+
+    strip=True strips every string on its own, so string boundaries matter: sanitizing
+    merged the strings around unwrapped and removed tags, and tightening moved
+    punctuation that follows </b> into the bold string.
+    """
+    text_ids = {id(text) for text in li.strings}
+    tokens = []  # merged strings, and markers where a kept tag or comment separates them
+
+    def walk(node):
+        for child in node.children:
+            if child.name is None:
+                if type(child) is NavigableString:
+                    if tokens and isinstance(tokens[-1], list):
+                        tokens[-1][0] += child
+                    else:
+                        tokens.append([str(child)])
+                elif id(child) in text_ids:
+                    tokens.extend(("tag", (str(child),), "tag"))  # CDATA: counted, never merged
+                else:
+                    tokens.append("tag")  # comment and the like
+            elif child.name in UNWRAPPED_TAGS:
+                walk(child)
+            elif not is_empty(child):
+                plain_bold = child.name == "b" and not child.attrs
+                tokens.append("b" if plain_bold else "tag")
+                walk(child)
+                tokens.append("/b" if plain_bold else "tag")
+
+    walk(li)
+    for i in range(len(tokens) - 3):
+        if tokens[i] == "b" and isinstance(tokens[i + 1], list) and tokens[i + 2] == "/b" \
+                and isinstance(tokens[i + 3], list) and tokens[i + 3][0].startswith(PUNCTUATION_AFTER_BOLD):
+            tokens[i + 1][0] += tokens[i + 3][0][0]
+            tokens[i + 3][0] = tokens[i + 3][0][1:]
+
+    return "".join(token[0].strip() for token in tokens if not isinstance(token, str))
+
+def html_to_story(html_text, styles, state=None):
+    """Flowables for the itinerary pages, from markdown_to_html output.
+
+    The HTML is parsed once and never rewritten: text that sanitize_html_for_pdf would
+    have removed with its empty tags is skipped while reading instead.
+    """
     soup = BeautifulSoup(html_text, "html.parser")
     story = []
-    section_seen = set()
+    empty_tags = {}
+
+    def is_empty(tag):
+        # Same test sanitize_html_for_pdf uses to decompose a tag
+        key = id(tag)
+        if key not in empty_tags:
+            empty_tags[key] = not tag.get_text(strip=True)
+        return empty_tags[key]
+
+    def kept_parent(node):
+        # <span>/<div> were unwrapped, so their text belonged to the next tag up
+        parent = node.parent
+        while parent.name in UNWRAPPED_TAGS:
+            parent = parent.parent
+        return parent
+
+    def element_text(elem):
+        # get_text() without the whitespace of empty tags, which sanitizing would have dropped
+        return "".join(text for text in elem.strings if not text.isspace() or not is_empty(kept_parent(text)))
+
+    def item_texts(elem):
+        texts = (list_item_text(li, is_empty) for li in elem.find_all("li"))
+        return [text for text in texts if text]
+    # Pass the same state dict when an itinerary is parsed block by block
+    state = {} if state is None else state
+    section_seen = state.setdefault("section_seen", set())
 
     def is_duplicate(text):
         return text.strip().lower() in section_seen
@@ -312,151 +470,68 @@ def html_to_story(html_text, styles):
         story.append(Spacer(1, 10))
         return True
 
+    def add_labelled(label, text):
+        add_paragraph(label, styles["EmojiText"])
+        if text:
+            add_paragraph(text, styles["NormalText"])
+
     def render_note_inline(text, styles):
         # Replace 'note:' with emoji-styled phrase inline
         styled_note = '<font name="Symbola"><b>📒: </b></font>'
-        updated = re.sub(r"(?i)\bnote:", styled_note, text)
+        updated = NOTE_LABEL.sub(styled_note, text)
         story.append(Paragraph(updated, styles["NormalText"]))
         story.append(Spacer(1, 10))
 
-    checklist_started = False
+    checklist_started = state.get("checklist_started", False)
 
     # --- Step 3: Render day-wise details ---
     for elem in soup.find_all(["p", "ul", "ol", "blockquote"]):
-        lines = elem.get_text().split("\n")
+        lines = element_text(elem).split("\n")
         for line in lines:
             line = line.strip()
             if not line:
                 continue
 
             # Skip top fields
-            if line.startswith("Travel Itinerary:") or any(
-                    line.startswith(prefix) for prefix in [
-                        "Primary Traveller Name:", "Travel Dates:", "Travelers:"
-                    ]
-            ):
+            if line.startswith(TOP_FIELD_PREFIXES):
                 continue
 
-            clean_line = line.lstrip("-").strip()
-
             # Day heading
-            if re.match(r"^Day\s+\d+:", line):
+            if DAY_HEADING.match(line):
                 section_seen.clear()
                 add_paragraph(f"<b>{line}</b>", styles["DayHeading"])
+                continue
+
+            clean_line = line.lstrip("-").strip()
+            match = LINE_CLASSIFIER.match(clean_line)
+            line_type = match.lastgroup if match else None
 
             # Time-wise split
-            elif re.match(r"^(Morning|Afternoon|Evening|Night|Early Morning|Early Afternoon|Late Afternoon|All Day|"
-                          r"Full Day|Morning till Evening|Late Evening|All day|Late Night):", clean_line, re.IGNORECASE):
-                match = re.match(r"^-?\s*(Morning|Afternoon|Evening|Night|Early Morning|Early Afternoon|Late Afternoon|All Day|"
-                                 r"Full Day|Morning till Evening|Late Evening|All day|Late Night):\s*(.*)", clean_line, re.IGNORECASE)
-                if match:
-                    time_label_raw = match.group(1).strip().title() + ":"
-                    description = match.group(2).strip()
-
-                    emoji_map = {
-                        "Morning:": "🌄",
-                        "Early Morning:": "🌄",
-                        "Afternoon:": "🌞",
-                        "Early Afternoon:": "🌅",
-                        "Evening:": "🌆",
-                        "Late Evening:": "🌃",
-                        "Night:": "🌠",
-                        "Late Afternoon:": "🫖",
-                        "Late Night:": "🌌",
-                        "All Day:": "📆",
-                        "Full Day:": "📅",
-                        "Morning Till Evening:": "🌕"
-                    }
-                    emoji = emoji_map.get(time_label_raw, "🕒")
-                    time_text = f"<b>{emoji} {time_label_raw}</b>"
-
-                    add_paragraph(time_text, styles["EmojiText"])
-                    if description:
-                        add_paragraph(description, styles["NormalText"])
+            if line_type == "time_of_day":
+                time_label_raw = match["time_label"].strip().title() + ":"
+                add_labelled(f"<b>{TIME_EMOJIS.get(time_label_raw, '🕒')} {time_label_raw}</b>", match["time_text"].strip())
 
             # Time-range label split
-            elif re.match(
-                    r"^(Morning|Afternoon|Evening|Night|All Day|Full day)"
-                    r"(\s*(to|&|and)\s*(Morning|Afternoon|Evening|Night|All Day|Full day))?:\s*(.*)",
-                    clean_line,
-                    re.IGNORECASE
-            ):
-                match = re.match(
-                    r"^(Morning|Afternoon|Evening|Night|All Day|Full day)"
-                    r"(\s*(to|&|and)\s*(Morning|Afternoon|Evening|Night|All Day|Full day))?:\s*(.*)",
-                    clean_line,
-                    re.IGNORECASE
-                )
-                if match:
-                    first_label = match.group(1).strip().title()
-                    connector = match.group(3)
-                    second_label = match.group(4).strip().title() if match.group(4) else None
-                    description = match.group(5).strip()
-
-                    if second_label:
-                        time_range = f"{first_label} {connector} {second_label}"
-                    else:
-                        time_range = first_label
-
-                    emoji = "🕒"
-                    time_text = f"<b>{emoji} {time_range}:</b>"
-
-                    add_paragraph(time_text, styles["EmojiText"])
-                    if description:
-                        add_paragraph(description, styles["NormalText"])
+            elif line_type == "time_range":
+                time_range = match["range_from"].strip().title()
+                if match["range_to"]:
+                    time_range = f"{time_range} {match['range_connector']} {match['range_to'].strip().title()}"
+                add_labelled(f"<b>🕒 {time_range}:</b>", match["range_text"].strip())
 
             # Accommodation split
-            elif re.match(r"^(Accommodation):", clean_line, re.IGNORECASE):
-                match = re.match(r"^-?\s*(Accommodation):\s*(.*)", clean_line, re.IGNORECASE)
-                if match:
-                    time_label_raw = match.group(1).strip().title() + ":"
-                    description = match.group(2).strip()
-
-                    emoji_map = {
-                        "Accommodation:": "🏘"
-                    }
-                    emoji = emoji_map.get(time_label_raw, "🕒")
-                    time_text = f"<b>{emoji} {time_label_raw}</b>"
-
-                    add_paragraph(time_text, styles["EmojiText"])
-                    if description:
-                        add_paragraph(description, styles["NormalText"])
-
-            # Day wise highlights summary
-            elif re.match(r"^day[-\s]?wise.*:", clean_line, re.IGNORECASE):
-                continue
+            elif line_type == "accommodation":
+                add_labelled("<b>🏘 Accommodation:</b>", match["accommodation_text"].strip())
 
-            # Time wise split summary
-            elif re.match(r"^time[-\s]?wise.*:", clean_line, re.IGNORECASE) or \
-                    re.match(r"^time[-\s]?split.*:", clean_line, re.IGNORECASE):
+            # Day wise highlights / time wise split summaries
+            elif line_type == "summary":
                 continue
 
-            # Highlights
-            elif clean_line.lower().startswith("highlight") or \
-                    clean_line.lower().startswith("day highlight") or \
-                    clean_line.lower().startswith("day-highlight"):
-                highlight_text = line.split(":", 1)[1].strip()
-                add_paragraph(f"<i>📸 Highlight:</i>", styles["EmojiText"])
-                if highlight_text:
-                    add_paragraph(highlight_text, styles["NormalText"])
-
-            # Travel Tips
-            elif clean_line.lower().startswith("travel tip") or \
-                    clean_line.lower().startswith("tip"):
-                tip_text = line.split(":", 1)[1].strip()
-                add_paragraph(f"<i>💡 Travel Tips:</i>", styles["EmojiText"])
-                if tip_text:
-                    add_paragraph(tip_text, styles["NormalText"])
-
-            # Local Experience
-            elif clean_line.lower().startswith("local experience"):
-                experience_text = line.split(":", 1)[1].strip()
-                add_paragraph(f"<i>🎯 Local Experience:</i>", styles["EmojiText"])
-                if experience_text:
-                    add_paragraph(experience_text, styles["NormalText"])
+            # Highlights, Travel Tips, Local Experience
+            elif line_type in SECTION_LABELS:
+                add_labelled(SECTION_LABELS[line_type], line.split(":", 1)[1].strip())
 
             # Checklist heading
-            elif clean_line.lower().startswith("packaging checklist"):
+            elif line_type == "checklist":
                 section_seen.clear()
                 story.append(PageBreak())
                 add_paragraph(f"<b>Packaging Checklist</b>", styles["DayHeading"])
@@ -483,15 +558,14 @@ def html_to_story(html_text, styles):
 
         # Handle <ul> and <ol> separately
         if checklist_started and elem.name == "ul":
-            for li in elem.find_all("li"):
-                li_text = li.get_text(strip=True)
+            for li_text in item_texts(elem):
                 add_paragraph(f"• {li_text}", styles["NormalText"])
 
         elif elem.name == "ol":
-            for i, li in enumerate(elem.find_all("li"), start=1):
-                li_text = li.get_text(strip=True)
+            for i, li_text in enumerate(item_texts(elem), start=1):
                 add_paragraph(f"{i}. {li_text}", styles["NormalText"])
 
+    state["checklist_started"] = checklist_started
     return story
 
 def render_summary_section(story, styles, tour_costs, inclusions, exclusions, contact_info, qr_buffer, doc, link_style):
@@ -531,7 +605,12 @@ def get_barcode_metadata(doc):
     # --- Barcode metadata ---
     traveler = getattr(doc, "traveler_name", "Unknown")
     destination = getattr(doc, "destination", "Unknown")
-    barcode_time = "ITIN-" + datetime.now().strftime("%Y%m%d%H%M%S")
+    clock = getattr(doc, "clock", datetime.now)
+    barcode_time = "ITIN-" + clock().strftime("%Y%m%d%H%M%S")
+    # Tells apart PDFs for the same traveler and destination built in the same second
+    suffix = getattr(doc, "barcode_suffix", None)
+    if suffix:
+        barcode_time += f"-{suffix}"
     barcode_data = f"{traveler}_{destination}_{barcode_time}".replace(" ", "_")
     return barcode_data
 
@@ -589,12 +668,13 @@ def draw_summary_page(canvas, doc):
 
 def add_coverpage(doc, story, image_flag=False):
     if image_flag:
-        cover_image = fetch_image(doc.destination)
-
         # Optional: scale image to fit page width
         image_width = doc.width
         image_height = image_width * 0.6  # Adjust aspect ratio as needed
 
+        # Resampled for the frame, so a 3500px photo doesn't go into the PDF as-is
+        cover_image = fetch_cover_image(doc.destination, image_width, image_height)
+
         story.append(Image(cover_image, width=image_width, height=image_height))
         story.append(Spacer(1, 24))  # Breathing room below image
 
@@ -612,27 +692,32 @@ def add_coverpage(doc, story, image_flag=False):
 
     return story
 
-def build_pdf_local(doc, story, pdf_path):
-    # ---- Build PDF ----
-    doc.build(story)
+def save_pdf_local(pdf_bytes, pdf_path):
+    # ---- Write the already built PDF to disk ----
+    with open(pdf_path, "wb") as f:
+        f.write(pdf_bytes)
     print(f"PDF generated at: {pdf_path}")
 
-    # Read PDF binary
-    with open(pdf_path, "rb") as f:
-        pdf_bytes = f.read()
+class PDFOutput:
+    """doc.build target that keeps the bytes ReportLab writes instead of copying them.
 
-def build_pdf_memory(doc, story):
-    # ---- Build PDF in memory----
-    # Create an in-memory buffer
-    pdf_buffer = BytesIO()
+    ReportLab assembles the whole PDF as one bytes object and writes it in a single call;
+    a BytesIO would copy it into its own buffer and hold the PDF twice.
+    """
 
-    # Build the PDF into the buffer
-    doc.build(story, filename=pdf_buffer)
+    def __init__(self):
+        self.parts = []
 
-    # Get the PDF bytes
-    pdf_bytes = pdf_buffer.getvalue()
+    def write(self, data):
+        self.parts.append(data)
+        return len(data)
 
-    # Optional: close the buffer
-    pdf_buffer.close()
+    def getvalue(self):
+        return self.parts[0] if len(self.parts) == 1 else b"".join(self.parts)
 
-    return pdf_bytes
\ No newline at end of file
+def build_pdf_memory(doc, story):
+    # ---- Build PDF in memory----
+    pdf_output = PDFOutput()
+    doc.build(story, filename=pdf_output)
+    # The one PDF buffer the rest of the pipeline hands around (disk, GridFS, BSON)
+    return pdf_output.getvalue()
\ No newline at end of file
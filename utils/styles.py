@@ -1,21 +1,94 @@
+import hashlib
+import os
+import pickle
+from fnmatch import fnmatch
+from weakref import WeakKeyDictionary
+
+from reportlab import Version as REPORTLAB_VERSION, rl_config
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.pdfmetrics import registerFontFamily
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace, TTEncoding
+
+FONT_CACHE_DIR = os.path.join("cache", "fonts")
+SYMBOLA_FULL_PATH = "fonts/Symbola.ttf"
+# Built by build_fonts.py: only the glyphs the PDFs can emit
+SYMBOLA_SUBSET_PATH = "fonts/Symbola-subset.ttf"
+
+FONT_FILES = {
+    "Montserrat": "fonts/Montserrat-Bold.ttf",
+    "Merienda": "fonts/Merienda-SemiBold.ttf",
+    "Poppins": "fonts/Poppins-SemiBold.ttf",
+    "Paprika": "fonts/Paprika-Regular.ttf",
+    "FacultyGlyphic": "fonts/FacultyGlyphic-Regular.ttf",
+    "Sansation": "fonts/Sansation-Regular.ttf",
+    "FiraSans": "fonts/FiraSans-Regular.ttf",
+    "FiraSans-Bold": "fonts/FiraSans-SemiBold.ttf",
+    "FiraSans-Italic": "fonts/FiraSans-Italic.ttf",
+}
+
+def get_symbola_path():
+    return SYMBOLA_SUBSET_PATH if os.path.exists(SYMBOLA_SUBSET_PATH) else SYMBOLA_FULL_PATH
+
+def _font_signature(path):
+    # File contents, not mtime: a cache warmed in the deploy step must still match after upload
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return path, digest, REPORTLAB_VERSION
+
+def _pdf_scale(units_per_em):
+    # Same scaling TTFontFile sets up while parsing; lambdas can't be pickled
+    if units_per_em == 1000:
+        return lambda x: x
+    _1000mult = 1000 / units_per_em
+    return lambda x: x * _1000mult
+
+def _ttfont_from_face(name, face):
+    # Mirrors TTFont.__init__ with an already parsed face
+    font = TTFont.__new__(TTFont)
+    font.fontName = name
+    font.face = face
+    font.encoding = TTEncoding()
+    font.state = WeakKeyDictionary()
+    font._asciiReadable = rl_config.ttfAsciiReadable
+    font.shapable = not any(fnmatch(name, pattern) for pattern in rl_config.unShapedFontGlob)
+    return font
+
+def load_ttfont(name, path):
+    """Return a TTFont for path, reusing face data parsed by an earlier process when the file is unchanged."""
+    signature = _font_signature(path)
+    cache_path = os.path.join(FONT_CACHE_DIR, f"{name}.pickle")
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached_signature, face_state = pickle.load(f)
+        if cached_signature == signature:
+            face = TTFontFace.__new__(TTFontFace)
+            face.__dict__.update(face_state)
+            face._pdfScale = _pdf_scale(face.unitsPerEm)
+            return _ttfont_from_face(name, face)
+    except Exception:
+        pass
+
+    font = TTFont(name, path)
+    face_state = {k: v for k, v in vars(font.face).items() if k != "_pdfScale"}
+    try:
+        os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+        # Write then rename so concurrent workers never read a half-written file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((signature, face_state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Read-only filesystem: keep working without the cache
+    return font
 
 def register_styles():
-    pdfmetrics.registerFont(TTFont("Symbola", "fonts/Symbola.ttf"))
-    pdfmetrics.registerFont(TTFont("Montserrat", "fonts/Montserrat-Bold.ttf"))
-    pdfmetrics.registerFont(TTFont("Merienda", "fonts/Merienda-SemiBold.ttf"))
-    pdfmetrics.registerFont(TTFont("Poppins", "fonts/Poppins-SemiBold.ttf"))
-    pdfmetrics.registerFont(TTFont("Paprika", "fonts/Paprika-Regular.ttf"))
-    pdfmetrics.registerFont(TTFont("FacultyGlyphic", "fonts/FacultyGlyphic-Regular.ttf"))
-    pdfmetrics.registerFont(TTFont("Sansation", "fonts/Sansation-Regular.ttf"))
-    pdfmetrics.registerFont(TTFont("FiraSans", "fonts/FiraSans-Regular.ttf"))
-    pdfmetrics.registerFont(TTFont("FiraSans-Bold", "fonts/FiraSans-SemiBold.ttf"))
-    pdfmetrics.registerFont(TTFont("FiraSans-Italic", "fonts/FiraSans-Italic.ttf"))
+    pdfmetrics.registerFont(load_ttfont("Symbola", get_symbola_path()))
+    for name, path in FONT_FILES.items():
+        pdfmetrics.registerFont(load_ttfont(name, path))
 
     registerFontFamily("FiraSans", normal="FiraSans", bold="FiraSans-Bold")
 
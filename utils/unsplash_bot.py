@@ -1,34 +1,181 @@
+import hashlib
+import math
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import requests
+from PIL import Image, ImageOps
+from requests.adapters import HTTPAdapter
+
+CACHE_DIR = "cache"
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", "100")) * 1024 * 1024
+PLACEHOLDER_URL = "https://images.unsplash.com/photo-1559311648-d46f5d8593d6?q=80&w=3500&auto=format&fit=crop&ixlib=rb-4.1.0&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D"
+LOCAL_PLACEHOLDER_PATH = os.path.join("images", "placeholder.jpg")
+UNSPLASH_RANDOM_URL = "https://api.unsplash.com/photos/random"
+# (connect, read) seconds; a slow Unsplash falls back to the placeholder instead of stalling a render
+HTTP_TIMEOUT = (3.05, 10)
+PREFETCH_WORKERS = 8
+# Embedded covers are resampled to this resolution for their frame and re-encoded as JPEG
+COVER_IMAGE_DPI = int(os.getenv("COVER_IMAGE_DPI", "150"))
+COVER_IMAGE_QUALITY = int(os.getenv("COVER_IMAGE_QUALITY", "80"))
+
+# Cache files (originals and processed covers) are named <sha256>.jpg; eviction never touches anything else
+CACHED_IMAGE_NAME = re.compile(r"^[0-9a-f]{64}\.jpg$")
+
+UNSPLASH_ACCESS_KEY = None
+PLACEHOLDER_IMAGE = None
+http_session = None
+_initialized = False
+_placeholder_lock = threading.Lock()
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
 
 def initialize_unsplash():
-    global IMAGE_CACHE_DIR, UNSPLASH_ACCESS_KEY, PLACEHOLDER_IMAGE
-    CACHE_DIR = "cache"
-    IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+    global UNSPLASH_ACCESS_KEY, _initialized
     UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
-    PLACEHOLDER_IMAGE = BytesIO(requests.get("https://images.unsplash.com/photo-1559311648-d46f5d8593d6?q=80&w=3500&auto=format&fit=crop&ixlib=rb-4.1.0&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D").content)
     os.makedirs(CACHE_DIR, exist_ok=True)
     os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    _initialized = True
+
+def get_http_session():
+    # One pooled session per process: API call and image download reuse the same connections
+    global http_session
+    if http_session is None:
+        with _session_lock:
+            if http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=PREFETCH_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                http_session = session
+    return http_session
+
+def get_placeholder_image():
+    """Download the placeholder on first use, falling back to the bundled copy."""
+    global PLACEHOLDER_IMAGE
+    if PLACEHOLDER_IMAGE is None:
+        with _placeholder_lock:
+            if PLACEHOLDER_IMAGE is None:
+                try:
+                    resp = get_http_session().get(PLACEHOLDER_URL, timeout=HTTP_TIMEOUT)
+                    resp.raise_for_status()
+                    PLACEHOLDER_IMAGE = resp.content
+                except Exception:
+                    with open(LOCAL_PLACEHOLDER_PATH, 'rb') as f:
+                        PLACEHOLDER_IMAGE = f.read()
+    # Fresh stream per caller so concurrent renders don't share a read position
+    return BytesIO(PLACEHOLDER_IMAGE)
+
+# ======= Disk cache =======
+def image_cache_path(query):
+    # Hashed names: any query is a safe, fixed-length file name
+    key = hashlib.sha256(query.strip().lower().encode()).hexdigest()
+    return os.path.join(IMAGE_CACHE_DIR, f"{key}.jpg")
+
+def _read_cached_image(cache_path):
+    try:
+        with open(cache_path, 'rb') as f:
+            img_data = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(cache_path)  # mtime is the LRU clock; atime is often disabled
+    return img_data
 
-def fetch_image(query, cacheFlag=False):
+def _write_cached_image(cache_path, img_data):
+    # Write then rename, so concurrent readers never see half a file
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(img_data)
+    os.replace(tmp_path, cache_path)
+    evict_image_cache()
+
+def evict_image_cache(max_bytes=None):
+    """Delete least recently used images until the cache fits in max_bytes."""
+    max_bytes = IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _cache_lock:
+        entries = []
+        with os.scandir(IMAGE_CACHE_DIR) as it:
+            for entry in it:
+                if CACHED_IMAGE_NAME.match(entry.name):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Evicted by another process
+            total -= size
+
+# ======= Fetching =======
+def fetch_image(query, cacheFlag=True):
     """Fetch image from Unsplash or return cached/fallback image."""
-    safe_query = query.replace(' ', '_')
-    cache_path = os.path.join(IMAGE_CACHE_DIR, f"{safe_query}.jpg")
+    if not _initialized:
+        initialize_unsplash()
+    cache_path = image_cache_path(query)
     if cacheFlag:
-        if os.path.exists(cache_path):
-            with open(cache_path, 'rb') as f:
-                return BytesIO(f.read())
+        img_data = _read_cached_image(cache_path)
+        if img_data is not None:
+            return BytesIO(img_data)
     try:
-        url = f"https://api.unsplash.com/photos/random?query={query}&client_id={UNSPLASH_ACCESS_KEY}"
-        resp = requests.get(url)
+        session = get_http_session()
+        resp = session.get(UNSPLASH_RANDOM_URL, params={"query": query, "client_id": UNSPLASH_ACCESS_KEY}, timeout=HTTP_TIMEOUT)
         if resp.status_code == 200:
             img_url = resp.json()["urls"]["regular"]
-            img_data = requests.get(img_url).content
-            with open(cache_path, 'wb') as f:
-                f.write(img_data)
+            img_resp = session.get(img_url, timeout=HTTP_TIMEOUT)
+            img_resp.raise_for_status()
+            img_data = img_resp.content
+            _write_cached_image(cache_path, img_data)
             return BytesIO(img_data)
     except Exception:
         pass
-    return PLACEHOLDER_IMAGE
+    return get_placeholder_image()
+
+def fetch_cover_image(query, width, height, dpi=None, quality=None):
+    """Image for a width x height point frame, downscaled to dpi and recompressed; the result is cached."""
+    dpi = dpi or COVER_IMAGE_DPI
+    quality = quality or COVER_IMAGE_QUALITY
+    source = fetch_image(query).getvalue()
+    size = (math.ceil(width * dpi / 72), math.ceil(height * dpi / 72))
+
+    # Keyed by the source bytes, so a refreshed photo or the placeholder each get their own variant
+    key = hashlib.sha256(source)
+    key.update(f"|{size[0]}x{size[1]}|q{quality}".encode())
+    cache_path = os.path.join(IMAGE_CACHE_DIR, f"{key.hexdigest()}.jpg")
+
+    img_data = _read_cached_image(cache_path)
+    if img_data is None:
+        img_data = downscale_image(source, size, quality)
+        _write_cached_image(cache_path, img_data)
+    return BytesIO(img_data)
+
+def downscale_image(img_data, size, quality):
+    """JPEG no larger than size in pixels. ReportLab embeds JPEGs as-is, so this is what lands in the PDF."""
+    with Image.open(BytesIO(img_data)) as img:
+        if img.format == "JPEG" and img.width <= size[0] and img.height <= size[1]:
+            return img_data  # Already small enough; re-encoding would only lose quality
+        img.draft("RGB", size)  # JPEG only: decode at a reduced scale, far cheaper than a full decode
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        # The frame stretches the image to its own aspect ratio anyway, so each axis is capped independently
+        target = (min(img.width, size[0]), min(img.height, size[1]))
+        if target != img.size:
+            img = img.resize(target, Image.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+def prefetch_images(queries, workers=PREFETCH_WORKERS):
+    """Fill the disk cache for all queries concurrently, so renders only read local files."""
+    queries = sorted({q for q in queries if q})
+    if not queries:
+        return 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(queries))) as pool:
+        list(pool.map(fetch_image, queries))
+    print(f"🖼️ Prefetched {len(queries)} cover images")
+    return len(queries)